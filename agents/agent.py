@@ -1,28 +1,55 @@
 # pylint: disable = http-used,print-used,no-self-use
 
+import asyncio
 import datetime
 import operator
 import os
-from typing import Annotated, TypedDict
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Annotated, Optional, TypedDict
 
 from dotenv import load_dotenv
-from langchain_core.messages import AnyMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, SystemMessage, ToolMessage
 from langchain_openai import ChatOpenAI
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, StateGraph
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
-
+from langgraph.utils.runnable import RunnableCallable
+from agents.checkpoint import CHECKPOINT_PATH, SqliteCheckpointSaver
+from agents.email_queue import EmailQueue, get_email_queue
+from agents.email_render import EMAIL_RENDERER, render_email
+from agents.history import HistoryManager
+from agents.llm_cache import get_llm_cache
+from agents.compaction import TOOL_RESULT_TOKEN_BUDGET, compact_tool_result
+from agents.telemetry import record_llm_usage, record_run_usage, tool_call, upstream_call
 from agents.tools.flights_finder import flights_finder
 from agents.tools.hotels_finder import hotels_finder
+from agents.tools.rate_limit import request_priority
+from agents.usage import LIMIT_LABELS, RunLimits, add_usage, llm_usage, usage_since
 
 _ = load_dotenv()
 
 CURRENT_YEAR = datetime.datetime.now().year
 
+# Tool calls from one LLM turn run concurrently, at most this many at a time,
+# and each one is abandoned (and reported to the model) after the timeout.
+# On the async path (graph.ainvoke/astream) a timed-out call is cancelled. The
+# sync path cannot stop a running tool thread: the call is left to finish in
+# the background, no longer counted against the concurrency limit, and its
+# result is dropped.
+TOOL_CONCURRENCY = int(os.getenv('AGENT_TOOL_CONCURRENCY', '4'))
+TOOL_TIMEOUT = float(os.getenv('AGENT_TOOL_TIMEOUT', '45'))
+
 
 class AgentState(TypedDict):
     messages: Annotated[list[AnyMessage], operator.add]
+    summary: str
+    summary_upto: int
+    # Thread totals (nodes return deltas), the totals when the current run
+    # started, and the limit that stopped the run, if any.
+    usage: Annotated[dict, add_usage]
+    run_start: dict
+    stop_reason: Optional[str]
 
 
 TOOLS_SYSTEM_PROMPT = f"""You are a smart travel agency. Use the tools to look up information.
@@ -137,65 +164,219 @@ Include links and images where available. Always show prices in USD and local cu
 
 class Agent:
 
-    def __init__(self):
+    def __init__(self, tool_concurrency: int = TOOL_CONCURRENCY, tool_timeout: float = TOOL_TIMEOUT,
+                 tool_result_tokens: int = TOOL_RESULT_TOKEN_BUDGET, checkpointer=None,
+                 history: Optional[HistoryManager] = None, email_renderer: str = EMAIL_RENDERER,
+                 email_queue: Optional[EmailQueue] = None, limits: Optional[RunLimits] = None):
         self._tools = {t.name: t for t in TOOLS}
-        self._tools_llm = ChatOpenAI(model='gpt-4o').bind_tools(TOOLS)
+        # stream_usage: token counts also arrive when the graph is streamed.
+        # The cache key covers the bound tools, so changing TOOLS never replays stale calls.
+        self._tools_llm = ChatOpenAI(model='gpt-4o', stream_usage=True, cache=get_llm_cache()).bind_tools(TOOLS)
+        self._tool_concurrency = tool_concurrency
+        self._tool_timeout = tool_timeout
+        self._tool_result_tokens = tool_result_tokens
+        self._history = history if history is not None else HistoryManager()
+        self._email_renderer = email_renderer
+        self._email_llm = None
+        self._email_queue = email_queue
+        self._limits = limits if limits is not None else RunLimits()
 
         builder = StateGraph(AgentState)
-        builder.add_node('call_tools_llm', self.call_tools_llm)
-        builder.add_node('invoke_tools', self.invoke_tools)
+        builder.add_node('call_tools_llm', RunnableCallable(self.call_tools_llm, self.acall_tools_llm, name='call_tools_llm'))
+        # graph.invoke runs the threaded node, graph.ainvoke/astream the async one
+        builder.add_node('invoke_tools', RunnableCallable(self.invoke_tools, self.ainvoke_tools, name='invoke_tools'))
         builder.add_node('email_sender', self.email_sender)
+        builder.add_node('stop_run', self.stop_run)
         builder.set_entry_point('call_tools_llm')
 
-        builder.add_conditional_edges('call_tools_llm', Agent.exists_action, {'more_tools': 'invoke_tools', 'email_sender': 'email_sender'})
-        builder.add_edge('invoke_tools', 'call_tools_llm')
+        builder.add_conditional_edges('call_tools_llm', self.exists_action,
+                                      {'more_tools': 'invoke_tools', 'email_sender': 'email_sender', 'stop_run': 'stop_run'})
+        builder.add_conditional_edges('invoke_tools', self.within_budget,
+                                      {'call_tools_llm': 'call_tools_llm', 'stop_run': 'stop_run'})
         builder.add_edge('email_sender', END)
-        memory = MemorySaver()
-        self.graph = builder.compile(checkpointer=memory, interrupt_before=['email_sender'])
+        builder.add_edge('stop_run', END)
+        # A shared SQLite file lets any worker resume a thread interrupted before email_sender
+        if checkpointer is None:
+            checkpointer = SqliteCheckpointSaver(CHECKPOINT_PATH) if CHECKPOINT_PATH else MemorySaver()
+        self.checkpointer = checkpointer
+        self.graph = builder.compile(checkpointer=checkpointer, interrupt_before=['email_sender'])
 
         print(self.graph.get_graph().draw_mermaid())
 
+    def close(self):
+        if isinstance(self.checkpointer, SqliteCheckpointSaver):
+            self.checkpointer.close()
+
+    def flush_checkpoints(self):
+        '''
+        Write out checkpoints still buffered by the saver. Call it when a run
+        ends or is interrupted, before telling the client, so a resume sent to
+        another worker reads the latest checkpoint.
+        '''
+        if isinstance(self.checkpointer, SqliteCheckpointSaver):
+            self.checkpointer.flush()
+
     @staticmethod
-    def exists_action(state: AgentState):
+    def run_usage(state: AgentState) -> dict:
+        return usage_since(state.get('usage'), state.get('run_start'))
+
+    def exists_action(self, state: AgentState):
         result = state['messages'][-1]
         if len(result.tool_calls) == 0:
             return 'email_sender'
+        # Refuse the requested tools if running them, or the LLM call after them, would break a limit
+        if self._limits.exceeded(self.run_usage(state), len(result.tool_calls)):
+            return 'stop_run'
         return 'more_tools'
 
-    def email_sender(self, state: AgentState):
-        print('Sending email')
-        email_llm = ChatOpenAI(model='gpt-4o', temperature=0.1)  # Instantiate another LLM
+    def within_budget(self, state: AgentState):
+        return 'stop_run' if self._limits.exceeded(self.run_usage(state)) else 'call_tools_llm'
+
+    def stop_run(self, state: AgentState):
+        '''
+        End a run that reached a limit. Tool calls the model asked for get an
+        answer so the thread stays valid to continue, then a final message says
+        why the run stopped.
+        '''
+        usage = self.run_usage(state)
+        last = state['messages'][-1]
+        pending = last.tool_calls if isinstance(last, AIMessage) else []
+        reason = self._limits.exceeded(usage, len(pending)) or 'unknown'
+        print(f'Run stopped: {reason} limit reached ({usage})')
+        record_run_usage(usage, reason)
+        messages = [ToolMessage(tool_call_id=t['id'], name=t['name'], content=f'not run: the {reason} limit was reached')
+                    for t in pending]
+        messages.append(AIMessage(content=f'I had to stop before finishing because this request reached its '
+                                          f'{LIMIT_LABELS.get(reason, reason)} limit. Here is what I found so far; ask me to '
+                                          f'continue to pick up from here.'))
+        return {'messages': messages, 'stop_reason': reason}
+
+    def _email_html(self, state: AgentState) -> tuple[str, Optional[dict]]:
+        # The template renders the structured tool results directly; the
+        # second LLM pass is kept behind AGENT_EMAIL_RENDERER=llm.
+        if self._email_renderer != 'llm':
+            return render_email(state['messages']), None
+        if self._email_llm is None:
+            self._email_llm = ChatOpenAI(model='gpt-4o', temperature=0.1, cache=get_llm_cache())  # Instantiate another LLM
         email_message = [SystemMessage(content=EMAILS_SYSTEM_PROMPT), HumanMessage(content=state['messages'][-1].content)]
-        email_response = email_llm.invoke(email_message)
-        print('Email content:', email_response.content)
+        started = time.perf_counter()
+        with upstream_call('openai', 'chat', model='gpt-4o', node='email_sender'):
+            message = self._email_llm.invoke(email_message)
+        record_llm_usage('gpt-4o', 'email_sender', message)
+        return message.content, llm_usage('gpt-4o', message, time.perf_counter() - started)
 
-        message = Mail(from_email=os.environ['FROM_EMAIL'], to_emails=os.environ['TO_EMAIL'], subject=os.environ['EMAIL_SUBJECT'],
-                       html_content=email_response.content)
-        try:
-            sg = SendGridAPIClient(os.environ.get('SENDGRID_API_KEY'))
-            response = sg.send(message)
-            print(response.status_code)
-            print(response.body)
-            print(response.headers)
-        except Exception as e:
-            print(str(e))
+    def email_sender(self, state: AgentState):
+        # Only enqueues: delivery, retries and batching happen on the queue's
+        # background workers, so the graph ends without waiting on SendGrid.
+        html_content, usage = self._email_html(state)
+        if self._email_queue is None:
+            self._email_queue = get_email_queue()
+        email_id = self._email_queue.enqueue(os.environ['FROM_EMAIL'], os.environ['TO_EMAIL'], os.environ['EMAIL_SUBJECT'],
+                                             html_content)
+        print(f'Email {email_id} queued')
+        # The run counts as completed only once its email is queued
+        record_run_usage(usage_since(add_usage(state.get('usage'), usage), state.get('run_start')), 'completed')
+        if usage:
+            return {'usage': usage}
+
+    @staticmethod
+    def _llm_update(state: AgentState, message, update: dict, started: float) -> dict:
+        usage = add_usage(update.pop('usage', None), llm_usage('gpt-4o', message, time.perf_counter() - started))
+        update = {'messages': [message], **update, 'usage': usage}
+        if isinstance(state['messages'][-1], HumanMessage):
+            # A new user message starts a run; its limits count from here
+            update.update(run_start=dict(state.get('usage') or {}), stop_reason=None)
+        return update
 
     def call_tools_llm(self, state: AgentState):
-        messages = state['messages']
-        messages = [SystemMessage(content=TOOLS_SYSTEM_PROMPT)] + messages
-        message = self._tools_llm.invoke(messages)
-        return {'messages': [message]}
+        started = time.perf_counter()
+        messages, update = self._history.prepare(state)
+        messages = [SystemMessage(content=self._history.system_prompt(TOOLS_SYSTEM_PROMPT, state, update))] + messages
+        with upstream_call('openai', 'chat', model='gpt-4o', node='call_tools_llm'):
+            message = self._tools_llm.invoke(messages)
+        record_llm_usage('gpt-4o', 'call_tools_llm', message)
+        return self._llm_update(state, message, update, started)
+
+    async def acall_tools_llm(self, state: AgentState):
+        started = time.perf_counter()
+        messages, update = await self._history.aprepare(state)
+        messages = [SystemMessage(content=self._history.system_prompt(TOOLS_SYSTEM_PROMPT, state, update))] + messages
+        with upstream_call('openai', 'chat', model='gpt-4o', node='call_tools_llm'):
+            message = await self._tools_llm.ainvoke(messages)
+        record_llm_usage('gpt-4o', 'call_tools_llm', message)
+        return self._llm_update(state, message, update, started)
+
+    def _tool_message(self, t: dict, result) -> ToolMessage:
+        # The model sees a compact table; the structured result rides along as
+        # the artifact, which is kept in state but never sent to the model.
+        content, tokens = compact_tool_result(t['name'], result, self._tool_result_tokens)
+        print(f"{t['name']}: {tokens['tokens']} tokens, {tokens['rows']}/{tokens['rows_total']} rows")
+        return ToolMessage(tool_call_id=t['id'], name=t['name'], content=content,
+                           artifact={'result': result, 'tokens': tokens})
+
+    def _call_tool(self, t: dict):
+        print(f'Calling: {t}')
+        if not t['name'] in self._tools:  # check for bad tool name from LLM
+            print('\n ....bad tool name....')
+            return 'bad tool name, retry'  # instruct LLM to retry if bad
+        try:
+            # Runs on the tool pool, which does not inherit the caller's context
+            with tool_call(t['name']), request_priority('agent'):
+                return self._tools[t['name']].invoke(t['args'])
+        except Exception as e:
+            return f'tool error: {e}'
 
-    def invoke_tools(self, state: AgentState):
-        tool_calls = state['messages'][-1].tool_calls
-        results = []
-        for t in tool_calls:
+    async def _acall_tool(self, t: dict, semaphore: asyncio.Semaphore):
+        async with semaphore:
             print(f'Calling: {t}')
             if not t['name'] in self._tools:  # check for bad tool name from LLM
                 print('\n ....bad tool name....')
-                result = 'bad tool name, retry'  # instruct LLM to retry if bad
-            else:
-                result = self._tools[t['name']].invoke(t['args'])
-            results.append(ToolMessage(tool_call_id=t['id'], name=t['name'], content=str(result)))
+                return 'bad tool name, retry'  # instruct LLM to retry if bad
+            try:
+                with tool_call(t['name']), request_priority('agent'):
+                    return await asyncio.wait_for(self._tools[t['name']].ainvoke(t['args']), self._tool_timeout)
+            except asyncio.TimeoutError:
+                return f'tool call timed out after {self._tool_timeout:g}s, retry'
+            except Exception as e:
+                return f'tool error: {e}'
+
+    def invoke_tools(self, state: AgentState):
+        tool_calls = state['messages'][-1].tool_calls
+        start = time.monotonic()
+        outputs = [None] * len(tool_calls)
+        waiting = deque(enumerate(tool_calls))
+        running = {}
+        # A thread per call, so an abandoned call never holds a thread a later
+        # call needs; starting calls only while fewer than tool_concurrency are
+        # running is what bounds the concurrency.
+        pool = ThreadPoolExecutor(max_workers=max(len(tool_calls), 1), thread_name_prefix='agent-tool')
+        try:
+            while waiting or running:
+                while waiting and len(running) < self._tool_concurrency:
+                    i, t = waiting.popleft()
+                    running[pool.submit(self._call_tool, t)] = (i, time.monotonic() + self._tool_timeout)
+                next_deadline = min(deadline for _, deadline in running.values())
+                done, _ = wait(running, timeout=max(0.0, next_deadline - time.monotonic()),
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, _ = running.pop(future)
+                    outputs[i] = future.result()
+                now = time.monotonic()
+                for future, (i, deadline) in list(running.items()):
+                    if deadline <= now:
+                        del running[future]
+                        outputs[i] = f'tool call timed out after {self._tool_timeout:g}s, retry'
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        results = [self._tool_message(t, result) for t, result in zip(tool_calls, outputs)]
+        print('Back to the model!')
+        return {'messages': results, 'usage': {'tool_calls': len(tool_calls), 'seconds': time.monotonic() - start}}
+
+    async def ainvoke_tools(self, state: AgentState):
+        tool_calls = state['messages'][-1].tool_calls
+        start = time.monotonic()
+        semaphore = asyncio.Semaphore(self._tool_concurrency)
+        outputs = await asyncio.gather(*(self._acall_tool(t, semaphore) for t in tool_calls))
+        results = [self._tool_message(t, result) for t, result in zip(tool_calls, outputs)]
         print('Back to the model!')
-        return {'messages': results}
+        return {'messages': results, 'usage': {'tool_calls': len(tool_calls), 'seconds': time.monotonic() - start}}
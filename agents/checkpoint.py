@@ -0,0 +1,318 @@
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+
+CHECKPOINT_PATH = os.getenv('AGENT_CHECKPOINT_PATH')
+CHECKPOINT_FLUSH_INTERVAL = float(os.getenv('AGENT_CHECKPOINT_FLUSH_INTERVAL', '0.05'))
+CHECKPOINT_BATCH_SIZE = int(os.getenv('AGENT_CHECKPOINT_BATCH_SIZE', '64'))
+CHECKPOINT_THREAD_TTL = float(os.getenv('AGENT_CHECKPOINT_THREAD_TTL', str(7 * 24 * 3600)))
+CHECKPOINT_MAX_THREADS = int(os.getenv('AGENT_CHECKPOINT_MAX_THREADS', '10000'))
+CHECKPOINT_KEEP = int(os.getenv('AGENT_CHECKPOINT_KEEP', '10'))
+CHECKPOINT_PRUNE_INTERVAL = float(os.getenv('AGENT_CHECKPOINT_PRUNE_INTERVAL', '300'))
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS threads_last_access ON threads (last_access);
+'''
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver[str]):
+    '''
+    LangGraph checkpointer backed by a local SQLite file, so threads survive
+    restarts and any worker pointing at the same file can resume them.
+
+    Writes are buffered and committed as one transaction every
+    `flush_interval` seconds or `batch_size` statements, whichever comes first;
+    reads flush the buffer first, so a thread always sees its own writes.
+    Before another process may resume a thread, call flush().
+    Threads idle for longer than `thread_ttl` or beyond the `max_threads` most
+    recently used are deleted, and only the newest `keep_checkpoints`
+    checkpoints of each thread are retained.
+    '''
+
+    def __init__(self, path: str, flush_interval: float = CHECKPOINT_FLUSH_INTERVAL,
+                 batch_size: int = CHECKPOINT_BATCH_SIZE, thread_ttl: float = CHECKPOINT_THREAD_TTL,
+                 max_threads: int = CHECKPOINT_MAX_THREADS, keep_checkpoints: int = CHECKPOINT_KEEP,
+                 prune_interval: float = CHECKPOINT_PRUNE_INTERVAL):
+        super().__init__()
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.thread_ttl = thread_ttl
+        self.max_threads = max_threads
+        self.keep_checkpoints = keep_checkpoints
+        self.prune_interval = prune_interval
+
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._conn_lock = threading.Lock()
+
+        self._pending: list[tuple[str, tuple]] = []
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._last_prune = 0.0
+        self._flusher = threading.Thread(target=self._flush_loop, name='checkpoint-flush', daemon=True)
+        self._flusher.start()
+
+    # -- batching -----------------------------------------------------------
+
+    def _enqueue(self, statements: list[tuple[str, tuple]]):
+        with self._pending_lock:
+            self._pending.extend(statements)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                if time.time() - self._last_prune >= self.prune_interval:
+                    self.prune()
+            except sqlite3.Error as e:
+                print(f'Checkpoint flush failed: {str(e)}')
+
+    def flush(self):
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        with self._conn_lock:
+            try:
+                self._conn.execute('BEGIN IMMEDIATE')
+                for sql, args in pending:
+                    self._conn.execute(sql, args)
+                self._conn.execute('COMMIT')
+            except BaseException:
+                if self._conn.in_transaction:
+                    self._conn.execute('ROLLBACK')
+                # Put the batch back ahead of anything queued since, so the next flush retries it in order
+                with self._pending_lock:
+                    self._pending[:0] = pending
+                raise
+
+    # -- retention ----------------------------------------------------------
+
+    def prune(self):
+        '''Drop idle and least recently used threads, then compact the survivors.'''
+        self._last_prune = time.time()
+        with self._conn_lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                expired = [row[0] for row in self._conn.execute(
+                    'SELECT thread_id FROM threads WHERE last_access < ?', (time.time() - self.thread_ttl,))]
+                expired += [row[0] for row in self._conn.execute(
+                    'SELECT thread_id FROM threads ORDER BY last_access DESC LIMIT -1 OFFSET ?', (self.max_threads,))]
+                for thread_id in set(expired):
+                    self._delete_thread(thread_id)
+                # Keep only the newest checkpoints (ids sort by time) of each thread/namespace.
+                self._conn.execute(
+                    'DELETE FROM checkpoints WHERE rowid IN ('
+                    ' SELECT rowid FROM ('
+                    '  SELECT rowid, ROW_NUMBER() OVER ('
+                    '   PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS n'
+                    '  FROM checkpoints) WHERE n > ?)', (self.keep_checkpoints,))
+                self._conn.execute(
+                    'DELETE FROM writes WHERE NOT EXISTS ('
+                    ' SELECT 1 FROM checkpoints c WHERE c.thread_id = writes.thread_id'
+                    ' AND c.checkpoint_ns = writes.checkpoint_ns AND c.checkpoint_id = writes.checkpoint_id)')
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('PRAGMA incremental_vacuum')
+
+    def _delete_thread(self, thread_id: str):
+        for table in ('checkpoints', 'writes', 'threads'):
+            self._conn.execute(f'DELETE FROM {table} WHERE thread_id = ?', (thread_id,))
+
+    def delete_thread(self, thread_id: str):
+        self.flush()
+        with self._conn_lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._delete_thread(thread_id)
+            self._conn.execute('COMMIT')
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        self._flusher.join()
+        self.flush()
+        with self._conn_lock:
+            self._conn.close()
+
+    # -- BaseCheckpointSaver --------------------------------------------------
+
+    def _query(self, sql: str, args: tuple) -> list:
+        self.flush()
+        with self._conn_lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    def _tuple(self, thread_id: str, checkpoint_ns: str, row) -> CheckpointTuple:
+        checkpoint_id, parent_checkpoint_id, type_, checkpoint, metadata_type, metadata = row
+        writes = self._query(
+            'SELECT task_id, channel, type, value FROM writes'
+            ' WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx',
+            (thread_id, checkpoint_ns, checkpoint_id))
+        return CheckpointTuple(
+            config={'configurable': {'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns,
+                                     'checkpoint_id': checkpoint_id}},
+            checkpoint=self.serde.loads_typed((type_, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config={'configurable': {'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns,
+                                            'checkpoint_id': parent_checkpoint_id}}
+            if parent_checkpoint_id else None,
+            pending_writes=[(task_id, channel, self.serde.loads_typed((t, v))) for task_id, channel, t, v in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        columns = 'checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata'
+        if checkpoint_id := get_checkpoint_id(config):
+            rows = self._query(
+                f'SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?',
+                (thread_id, checkpoint_ns, checkpoint_id))
+        else:
+            rows = self._query(
+                f'SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?'
+                ' ORDER BY checkpoint_id DESC LIMIT 1',
+                (thread_id, checkpoint_ns))
+        if not rows:
+            return None
+        self._enqueue([('INSERT OR REPLACE INTO threads (thread_id, last_access) VALUES (?, ?)',
+                        (thread_id, time.time()))])
+        return self._tuple(thread_id, checkpoint_ns, rows[0])
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        where, args = [], []
+        if config is not None:
+            where.append('thread_id = ?')
+            args.append(config['configurable']['thread_id'])
+            if (checkpoint_ns := config['configurable'].get('checkpoint_ns')) is not None:
+                where.append('checkpoint_ns = ?')
+                args.append(checkpoint_ns)
+        if before is not None and (before_id := get_checkpoint_id(before)):
+            where.append('checkpoint_id < ?')
+            args.append(before_id)
+        sql = ('SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint,'
+               ' metadata_type, metadata FROM checkpoints')
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY checkpoint_id DESC'
+        yielded = 0
+        for thread_id, checkpoint_ns, *row in self._query(sql, tuple(args)):
+            checkpoint_tuple = self._tuple(thread_id, checkpoint_ns, row)
+            if filter and any(checkpoint_tuple.metadata.get(k) != v for k, v in filter.items()):
+                continue
+            yield checkpoint_tuple
+            yielded += 1
+            if limit is not None and yielded >= limit:
+                return
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        type_, serialized = self.serde.dumps_typed(checkpoint)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(metadata)
+        self._enqueue([
+            ('INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,'
+             ' type, checkpoint, metadata_type, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+             (thread_id, checkpoint_ns, checkpoint['id'], config['configurable'].get('checkpoint_id'),
+              type_, serialized, metadata_type, serialized_metadata)),
+            ('INSERT OR REPLACE INTO threads (thread_id, last_access) VALUES (?, ?)', (thread_id, time.time())),
+        ])
+        return {'configurable': {'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns,
+                                 'checkpoint_id': checkpoint['id']}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str = '') -> None:
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        checkpoint_id = config['configurable']['checkpoint_id']
+        # Special channels (errors, interrupts) overwrite; regular writes are idempotent per task.
+        verb = 'INSERT OR REPLACE' if all(c in WRITES_IDX_MAP for c, _ in writes) else 'INSERT OR IGNORE'
+        statements = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, serialized = self.serde.dumps_typed(value)
+            statements.append((
+                f'{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                 channel, type_, serialized)))
+        self._enqueue(statements)
+
+    def get_next_version(self, current: Optional[str], channel) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split('.')[0])
+        return f'{current_v + 1:032}.{random.random():016}'
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        for checkpoint_tuple in await asyncio.to_thread(
+                lambda: list(self.list(config, filter=filter, before=before, limit=limit))):
+            yield checkpoint_tuple
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        # Only serializes and buffers; the flusher thread does the I/O.
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = '') -> None:
+        return self.put_writes(config, writes, task_id, task_path)
@@ -0,0 +1,152 @@
+import os
+from functools import lru_cache
+
+import tiktoken
+
+TOOL_RESULT_TOKEN_BUDGET = int(os.getenv('AGENT_TOOL_RESULT_TOKENS', '1200'))
+MAX_CELL_CHARS = 120
+
+
+# Rough OpenAI average, used when the tokenizer files cannot be loaded.
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    # tiktoken downloads its BPE files on first use; without network access
+    # fall back to a character estimate rather than failing the tool call.
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding('o200k_base')
+    except Exception as e:
+        print(f'tiktoken unavailable, estimating tokens: {str(e)}')
+        return None
+
+
+def count_tokens(text: str, model: str = 'gpt-4o') -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _minutes(value):
+    if value is None:
+        return None
+    hours, minutes = divmod(int(value), 60)
+    return f'{hours}h{minutes:02d}m'
+
+
+def _route(flight: dict):
+    legs = flight.get('legs') or []
+    if not legs:
+        return None
+    parts = [f"{leg.get('departure_airport')} {(leg.get('departure_time') or '')[-5:]}" for leg in legs]
+    last = legs[-1]
+    parts.append(f"{last.get('arrival_airport')} {(last.get('arrival_time') or '')[-5:]}")
+    return ' > '.join(parts)
+
+
+def _money(value):
+    return None if value is None else f'${value:,.0f}'
+
+
+# Per tool: (column, getter) in priority order. Columns are dropped from the
+# end until the table fits the budget, but never below the first `ESSENTIAL`.
+TABLES = {
+    'flights_finder': [
+        ('price', lambda r: _money(r.get('price'))),
+        ('carrier', lambda r: r.get('carrier')),
+        ('stops', lambda r: r.get('stops')),
+        ('duration', lambda r: _minutes(r.get('total_duration'))),
+        ('route', _route),
+        ('flights', lambda r: ', '.join(l.get('flight_number') or '' for l in r.get('legs') or []) or None),
+        ('link', lambda r: r.get('booking_link')),
+        ('logo', lambda r: r.get('carrier_logo')),
+    ],
+    'hotels_finder': [
+        ('name', lambda r: r.get('name')),
+        ('per_night', lambda r: _money(r.get('price_per_night'))),
+        ('total', lambda r: _money(r.get('total_price'))),
+        ('rating', lambda r: r.get('rating')),
+        ('reviews', lambda r: r.get('reviews')),
+        ('class', lambda r: r.get('hotel_class')),
+        ('link', lambda r: r.get('link')),
+        ('image', lambda r: r.get('thumbnail')),
+        ('amenities', lambda r: ', '.join(r.get('amenities') or []) or None),
+    ],
+    'activities_finder': [
+        ('name', lambda r: r.get('name')),
+        ('rating', lambda r: r.get('rating')),
+        ('category', lambda r: r.get('category')),
+        ('price', lambda r: r.get('price')),
+        ('reviews', lambda r: r.get('reviews')),
+        ('address', lambda r: r.get('address')),
+        ('link', lambda r: r.get('link')),
+    ],
+}
+ESSENTIAL = 3
+
+
+def _cell(value) -> str:
+    if value is None:
+        return ''
+    text = str(value).replace('|', '/').replace('\n', ' ')
+    return text if len(text) <= MAX_CELL_CHARS else text[:MAX_CELL_CHARS - 1] + '…'
+
+
+def _truncate(text: str, budget: int, model: str) -> str:
+    encoding = _encoding(model)
+    if encoding is None:
+        limit = budget * CHARS_PER_TOKEN
+        return text if len(text) <= limit else text[:limit] + ' …'
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= budget:
+        return text
+    return encoding.decode(tokens[:budget]) + ' …'
+
+
+def compact_tool_result(name: str, result, budget: int = TOOL_RESULT_TOKEN_BUDGET, model: str = 'gpt-4o'):
+    '''
+    Render a tool result as a pipe table of the fields the model needs, within
+    `budget` tokens. Low-priority columns go first, then trailing rows.
+
+    Returns the text and a stats dict (tokens, budget, rows kept/total, columns kept).
+    '''
+    columns = TABLES.get(name)
+    if columns is None or not isinstance(result, list) or not all(isinstance(r, dict) for r in result):
+        text = _truncate(str(result), budget, model)
+        return text, {'tokens': count_tokens(text, model), 'budget': budget, 'rows': None, 'rows_total': None}
+
+    rows_total = len(result)
+    if not result:
+        text = 'no results'
+        return text, {'tokens': count_tokens(text, model), 'budget': budget, 'rows': 0, 'rows_total': 0}
+
+    cells = [[_cell(getter(r)) for _, getter in columns] for r in result]
+    width = len(columns)
+    while True:
+        header = '#|' + '|'.join(column for column, _ in columns[:width])
+        lines = [header] + [f'{i + 1}|' + '|'.join(row[:width]) for i, row in enumerate(cells)]
+        line_tokens = [count_tokens(line, model) + 1 for line in lines]
+        if sum(line_tokens) <= budget or width <= ESSENTIAL:
+            break
+        width -= 1
+
+    # Still too large with only the essential columns: keep as many rows as fit.
+    kept, used = 1, line_tokens[0]
+    while kept < len(lines) and used + line_tokens[kept] <= budget:
+        used += line_tokens[kept]
+        kept += 1
+    text = '\n'.join(lines[:kept])
+    if kept < len(lines):
+        text += f'\n({len(lines) - kept} more rows omitted)'
+    return text, {
+        'tokens': count_tokens(text, model),
+        'budget': budget,
+        'rows': kept - 1,
+        'rows_total': rows_total,
+        'columns': [column for column, _ in columns[:width]],
+    }
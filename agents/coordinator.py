@@ -1,13 +1,47 @@
+import asyncio
+import os
+import time
 from datetime import datetime
-from typing import Optional
+from typing import Awaitable, Optional
+from langchain_openai import ChatOpenAI
+from .optimizer import best_bundles
 from .travel_agents import FlightAgent, HotelAgent, ActivityAgent, RestaurantAgent
 
+# Per-leg deadlines in seconds; a leg that misses its deadline is cancelled
+# and reported as timed out while the other legs still return.
+LEG_TIMEOUTS = {
+    "flights": float(os.getenv("TRIP_FLIGHTS_TIMEOUT", "20")),
+    "hotels": float(os.getenv("TRIP_HOTELS_TIMEOUT", "20")),
+    "activities": float(os.getenv("TRIP_ACTIVITIES_TIMEOUT", "10")),
+    "restaurants": float(os.getenv("TRIP_RESTAURANTS_TIMEOUT", "10")),
+}
+TRIP_TOP_BUNDLES = int(os.getenv("TRIP_TOP_BUNDLES", "5"))
+
 class TravelCoordinator:
-    def __init__(self):
-        self.flight_agent = FlightAgent()
-        self.hotel_agent = HotelAgent()
-        self.activity_agent = ActivityAgent()
-        self.restaurant_agent = RestaurantAgent()
+    def __init__(self, llm: Optional[ChatOpenAI] = None):
+        llm = llm if llm is not None else ChatOpenAI(model='gpt-4')
+        self.flight_agent = FlightAgent(llm)
+        self.hotel_agent = HotelAgent(llm)
+        self.activity_agent = ActivityAgent(llm)
+        self.restaurant_agent = RestaurantAgent(llm)
+
+    @staticmethod
+    async def _run_leg(name: str, search: Awaitable, timeout: float):
+        start = time.perf_counter()
+        status = {"status": "ok"}
+        data = None
+        try:
+            data = await asyncio.wait_for(search, timeout)
+            if isinstance(data, str):  # Error case: the tool returned its error message
+                status = {"status": "error", "error": data}
+                data = None
+        except asyncio.TimeoutError:
+            status = {"status": "timeout", "error": f"{name} search exceeded {timeout:g}s"}
+        except Exception as e:
+            print(f"Exception in {name} leg: {str(e)}")
+            status = {"status": "error", "error": str(e)}
+        status["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return status, data
 
     async def plan_trip(
         self,
@@ -18,51 +52,57 @@ class TravelCoordinator:
         budget: float,
         travelers: int = 1,
         include_activities: bool = True,
-        include_restaurants: bool = True
+        include_restaurants: bool = True,
+        leg_timeouts: Optional[dict] = None,
+        top_k: Optional[int] = None
     ):
-        # Split budget (example allocation)
-        flight_budget = budget * 0.4
-        hotel_budget = budget * 0.4
-        activities_budget = budget * 0.2
-
-        # Get flights
-        flights = await self.flight_agent.search(
-            departure=departure,
-            arrival=destination,
-            date=start_date,
-            budget=flight_budget,
-            travelers=travelers
-        )
-
-        # Get hotels
-        hotels = await self.hotel_agent.search(
-            location=destination,
-            check_in=start_date,
-            check_out=end_date,
-            budget=hotel_budget,
-            guests=travelers
-        )
+        timeouts = {**LEG_TIMEOUTS, **(leg_timeouts or {})}
 
-        # Get activities if requested
-        activities = None
+        # Each leg is only capped by the whole budget; how it is shared
+        # between flight, hotel and activity is decided by the optimizer.
+        legs = {
+            "flights": self.flight_agent.search(
+                departure=departure,
+                arrival=destination,
+                date=start_date,
+                return_date=end_date,
+                budget=budget,
+                travelers=travelers
+            ),
+            "hotels": self.hotel_agent.search(
+                location=destination,
+                check_in=start_date,
+                check_out=end_date,
+                budget=budget,
+                guests=travelers
+            ),
+        }
         if include_activities:
-            activities = await self.activity_agent.search(
+            legs["activities"] = self.activity_agent.search(
                 location=destination,
                 date=start_date,
                 budget="medium" if budget > 1000 else "low"
             )
-
-        # Get restaurants if requested
-        restaurants = None
         if include_restaurants:
-            restaurants = await self.restaurant_agent.search(
+            legs["restaurants"] = self.restaurant_agent.search(
                 location=destination,
                 budget="medium" if budget > 1000 else "low"
             )
 
-        return {
-            "flights": flights,
-            "hotels": hotels,
-            "activities": activities,
-            "restaurants": restaurants
-        } 
\ No newline at end of file
+        # All legs run at once, so the plan takes as long as the slowest leg
+        # (bounded by its deadline) rather than the sum of all of them.
+        outcomes = await asyncio.gather(*(
+            self._run_leg(name, search, timeouts[name]) for name, search in legs.items()
+        ))
+
+        plan = {"flights": None, "hotels": None, "activities": None, "restaurants": None}
+        statuses = {name: {"status": "skipped"} for name in plan}
+        for name, (status, data) in zip(legs, outcomes):
+            plan[name] = data
+            statuses[name] = status
+        plan["legs"] = statuses
+        nights = (datetime.fromisoformat(end_date) - datetime.fromisoformat(start_date)).days
+        plan["bundles"] = best_bundles(plan["flights"], plan["hotels"], plan["activities"],
+                                       budget, nights=nights, k=top_k or TRIP_TOP_BUNDLES)
+        plan["complete"] = all(s["status"] in ("ok", "skipped") for s in statuses.values())
+        return plan
@@ -0,0 +1,275 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Unset or empty keeps the outbox in memory, so it does not survive a restart;
+# set a path (the multi-worker server in api/server.py does) to make it durable.
+EMAIL_QUEUE_PATH = os.getenv('EMAIL_QUEUE_PATH', '')
+EMAIL_SENDER = os.getenv('EMAIL_SENDER', 'sendgrid')
+EMAIL_CONCURRENCY = int(os.getenv('EMAIL_CONCURRENCY', '4'))
+EMAIL_BATCH_SIZE = int(os.getenv('EMAIL_BATCH_SIZE', '50'))
+EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', '6'))
+EMAIL_RETRY_BASE_DELAY = float(os.getenv('EMAIL_RETRY_BASE_DELAY', '2'))
+EMAIL_RETRY_MAX_DELAY = float(os.getenv('EMAIL_RETRY_MAX_DELAY', '600'))
+EMAIL_POLL_INTERVAL = float(os.getenv('EMAIL_POLL_INTERVAL', '0.5'))
+# A row left in 'sending' longer than this (worker crashed mid-send) is retried.
+EMAIL_SEND_LEASE = float(os.getenv('EMAIL_SEND_LEASE', '300'))
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    from_email TEXT NOT NULL,
+    to_email TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    html_content TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+'''
+
+
+@dataclass(slots=True)
+class OutboxEmail:
+    id: int
+    from_email: str
+    to_email: str
+    subject: str
+    html_content: str
+    attempts: int
+
+
+class PermanentSendError(Exception):
+    '''The provider rejected the message; retrying will not help.'''
+
+
+class SendGridSender:
+    '''
+    Sends a group of emails that share sender, subject and body as one
+    SendGrid request, with one personalization per recipient.
+    '''
+
+    def __init__(self, api_key: Optional[str] = None):
+        from sendgrid import SendGridAPIClient
+        self._client = SendGridAPIClient(api_key or os.environ.get('SENDGRID_API_KEY'))
+
+    def send(self, emails: list[OutboxEmail]):
+        from sendgrid.helpers.mail import Mail, Personalization, To
+
+        first = emails[0]
+        message = Mail(from_email=first.from_email, subject=first.subject, html_content=first.html_content)
+        for email in emails:
+            personalization = Personalization()
+            personalization.add_to(To(email.to_email))
+            message.add_personalization(personalization)
+        try:
+            response = self._client.send(message)
+        except Exception as e:
+            status = getattr(e, 'status_code', None)
+            if status is not None and 400 <= status < 500 and status != 429:
+                raise PermanentSendError(str(e)) from e
+            raise
+        print(f'SendGrid accepted {len(emails)} email(s): {response.status_code}')
+
+
+class StubSender:
+    '''
+    Records what would have been sent; `fail_times` makes the first N sends
+    raise, and a send that includes an address in `reject` is refused for good.
+    '''
+
+    def __init__(self, fail_times: int = 0, reject: Iterable[str] = ()):
+        self.sent: list[OutboxEmail] = []
+        self.calls = 0
+        self.fail_times = fail_times
+        self.reject = set(reject)
+        self._lock = threading.Lock()
+
+    def send(self, emails: list[OutboxEmail]):
+        with self._lock:
+            self.calls += 1
+            if self.calls <= self.fail_times:
+                raise RuntimeError('stub send failure')
+            rejected = [email.to_email for email in emails if email.to_email in self.reject]
+            if rejected:
+                raise PermanentSendError(f'stub rejected {", ".join(rejected)}')
+            self.sent.extend(emails)
+
+
+class EmailQueue:
+    '''
+    Durable outbox for agent emails. `enqueue` only writes a row to SQLite;
+    a background dispatcher claims due rows in batches, groups identical
+    messages into one provider call, sends the groups on a bounded pool and
+    reschedules failures with exponential backoff and jitter. A group the
+    provider rejects outright is retried one email at a time, so only the bad
+    recipients fail.
+    Several processes can share one outbox file; claims are transactional.
+    '''
+
+    def __init__(self, path: str = EMAIL_QUEUE_PATH, sender=None, concurrency: int = EMAIL_CONCURRENCY,
+                 batch_size: int = EMAIL_BATCH_SIZE, max_attempts: int = EMAIL_MAX_ATTEMPTS,
+                 base_delay: float = EMAIL_RETRY_BASE_DELAY, max_delay: float = EMAIL_RETRY_MAX_DELAY,
+                 poll_interval: float = EMAIL_POLL_INTERVAL):
+        self.sender = sender if sender is not None else (StubSender() if EMAIL_SENDER == 'stub' else SendGridSender())
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self._conn = sqlite3.connect(path or ':memory:', timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='email-send')
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._dispatcher: Optional[threading.Thread] = None
+
+    def enqueue(self, from_email: str, to_email: str, subject: str, html_content: str) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT INTO outbox (from_email, to_email, subject, html_content, next_attempt_at, created_at, updated_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (from_email, to_email, subject, html_content, now, now, now))
+        self.start()
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def start(self):
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._stopped.clear()
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name='email-dispatch', daemon=True)
+            self._dispatcher.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout)
+        self._pool.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._conn.execute('SELECT status, COUNT(*) FROM outbox GROUP BY status').fetchall())
+
+    def drain(self, timeout: float = 10) -> bool:
+        '''Wait until nothing is pending or sending; used by tests and shutdown.'''
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            stats = self.stats()
+            if not stats.get('pending') and not stats.get('sending'):
+                return True
+            self._wakeup.set()
+            time.sleep(0.05)
+        return False
+
+    def _claim(self) -> list[OutboxEmail]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._conn.execute(
+                    'SELECT id, from_email, to_email, subject, html_content, attempts FROM outbox'
+                    " WHERE (status = 'pending' AND next_attempt_at <= ?) OR (status = 'sending' AND updated_at < ?)"
+                    ' ORDER BY next_attempt_at LIMIT ?',
+                    (now, now - EMAIL_SEND_LEASE, self.batch_size)).fetchall()
+                self._conn.executemany(
+                    "UPDATE outbox SET status = 'sending', updated_at = ? WHERE id = ?", [(now, row[0]) for row in rows])
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return [OutboxEmail(*row) for row in rows]
+
+    def _finish(self, emails: list[OutboxEmail], error: Optional[Exception]):
+        now = time.time()
+        updates = []
+        for email in emails:
+            attempts = email.attempts + 1
+            if error is None:
+                updates.append(("UPDATE outbox SET status = 'sent', attempts = ?, last_error = NULL, updated_at = ?"
+                                ' WHERE id = ?', (attempts, now, email.id)))
+            elif isinstance(error, PermanentSendError) or attempts >= self.max_attempts:
+                updates.append(("UPDATE outbox SET status = 'failed', attempts = ?, last_error = ?, updated_at = ?"
+                                ' WHERE id = ?', (attempts, str(error), now, email.id)))
+            else:
+                delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1)) * random.uniform(0.5, 1.5)
+                updates.append(("UPDATE outbox SET status = 'pending', attempts = ?, last_error = ?,"
+                                ' next_attempt_at = ?, updated_at = ? WHERE id = ?',
+                                (attempts, str(error), now + delay, now, email.id)))
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                for sql, args in updates:
+                    self._conn.execute(sql, args)
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def _send_group(self, emails: list[OutboxEmail]):
+        try:
+            self.sender.send(emails)
+        except PermanentSendError as e:
+            if len(emails) == 1:
+                print(f'Email {emails[0].id} rejected: {str(e)}')
+                self._finish(emails, e)
+                return
+            # One bad recipient fails the whole request; find it by sending each on its own
+            print(f'Email group rejected ({len(emails)} email(s)), sending them one by one: {str(e)}')
+            for email in emails:
+                self._send_group([email])
+        except Exception as e:
+            print(f'Email send failed ({len(emails)} email(s)): {str(e)}')
+            self._finish(emails, e)
+        else:
+            self._finish(emails, None)
+
+    def _dispatch_loop(self):
+        while not self._stopped.is_set():
+            try:
+                emails = self._claim()
+            except sqlite3.Error as e:
+                print(f'Email queue claim failed: {str(e)}')
+                emails = []
+            if not emails:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            groups: dict[tuple, list[OutboxEmail]] = {}
+            for email in emails:
+                groups.setdefault((email.from_email, email.subject, email.html_content), []).append(email)
+            futures = [self._pool.submit(self._send_group, group) for group in groups.values()]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    # The group stays 'sending' and is claimed again once its lease expires
+                    print(f'Email queue update failed: {str(e)}')
+
+
+_queue: Optional[EmailQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_email_queue() -> EmailQueue:
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = EmailQueue()
+        return _queue
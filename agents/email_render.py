@@ -0,0 +1,154 @@
+import os
+
+from jinja2 import Environment, select_autoescape
+from markupsafe import Markup, escape
+from langchain_core.messages import AnyMessage, HumanMessage, ToolMessage
+
+EMAIL_RENDERER = os.getenv('AGENT_EMAIL_RENDERER', 'template')
+
+EMAIL_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+    <title>{{ title }}</title>
+</head>
+<body>
+    {% if summary %}
+    <p>{{ summary | lines }}</p>
+    {% endif %}
+    {% for section in flights %}
+    <h2>{{ section.title }}</h2>
+    <ol>
+        {% for f in section.options %}
+        <li>
+            <strong>{{ f.carrier or 'Flight' }}</strong><br>
+            {% set first = f.legs[0] if f.legs else {} %}{% set last = f.legs[-1] if f.legs else {} %}
+            {% if first %}
+            <strong>Departure:</strong> {{ first.departure_name or first.departure_airport }} ({{ first.departure_airport }}) at {{ first.departure_time }}<br>
+            <strong>Arrival:</strong> {{ last.arrival_name or last.arrival_airport }} ({{ last.arrival_airport }}) at {{ last.arrival_time }}<br>
+            {% endif %}
+            {% if f.total_duration %}
+            <strong>Duration:</strong> {{ f.total_duration | duration }}{% if f.stops %} ({{ f.stops }} stop{{ 's' if f.stops > 1 }}){% endif %}<br>
+            {% endif %}
+            {% if first.airplane %}
+            <strong>Aircraft:</strong> {{ first.airplane }}<br>
+            {% endif %}
+            {% if first.travel_class %}
+            <strong>Class:</strong> {{ first.travel_class }}<br>
+            {% endif %}
+            {% if f.price is not none %}
+            <strong>Price:</strong> {{ f.price | money }}<br>
+            {% endif %}
+            {% if f.carrier_logo %}
+            <img src="{{ f.carrier_logo }}" alt="{{ f.carrier }}"><br>
+            {% endif %}
+            {% if f.booking_link %}
+            <a href="{{ f.booking_link }}">Book on Google Flights</a>
+            {% endif %}
+        </li>
+        {% endfor %}
+    </ol>
+    {% endfor %}
+    {% for section in hotels %}
+    <h2>{{ section.title }}</h2>
+    <ol>
+        {% for h in section.options %}
+        <li>
+            <strong>{{ h.name }}</strong><br>
+            {% if h.description %}
+            <strong>Description:</strong> {{ h.description }}<br>
+            {% endif %}
+            {% if h.price_per_night is not none %}
+            <strong>Rate per Night:</strong> {{ h.price_per_night | money }}<br>
+            {% endif %}
+            {% if h.total_price is not none %}
+            <strong>Total Rate:</strong> {{ h.total_price | money }}<br>
+            {% endif %}
+            {% if h.rating %}
+            <strong>Rating:</strong> {{ h.rating }}/5{% if h.reviews %} ({{ h.reviews }} reviews){% endif %}<br>
+            {% endif %}
+            {% if h.amenities %}
+            <strong>Amenities:</strong> {{ h.amenities | join(', ') }}<br>
+            {% endif %}
+            {% if h.thumbnail %}
+            <img src="{{ h.thumbnail }}" alt="{{ h.name }}"><br>
+            {% endif %}
+            {% if h.link %}
+            <a href="{{ h.link }}">Visit Website</a>
+            {% endif %}
+        </li>
+        {% endfor %}
+    </ol>
+    {% endfor %}
+</body>
+</html>
+"""
+
+
+def _duration(minutes) -> str:
+    hours, minutes = divmod(int(minutes), 60)
+    if not minutes:
+        return f'{hours} hours'
+    return f'{hours} hours {minutes} minutes'
+
+
+def _money(value) -> str:
+    return f'${value:,.0f}'
+
+
+def _lines(text: str) -> Markup:
+    return Markup('<br>\n').join(escape(line) for line in str(text).splitlines())
+
+
+_env = Environment(autoescape=select_autoescape(default=True, default_for_string=True), trim_blocks=True, lstrip_blocks=True)
+_env.filters['duration'] = _duration
+_env.filters['money'] = _money
+_env.filters['lines'] = _lines
+# Compiled once at import; rendering is a plain function call afterwards.
+_template = _env.from_string(EMAIL_TEMPLATE)
+
+
+def _flight_title(args: dict, options: list) -> str:
+    params = args.get('params') or {}
+    origin, destination = params.get('departure_airport'), params.get('arrival_airport')
+    if not (origin and destination) and options and options[0].get('legs'):
+        origin = origin or options[0]['legs'][0].get('departure_airport')
+        destination = destination or options[0]['legs'][-1].get('arrival_airport')
+    date = params.get('outbound_date')
+    return f"Flights from {origin} to {destination}" + (f" on {date}" if date else '')
+
+
+def _hotel_title(args: dict) -> str:
+    params = args.get('params') or {}
+    title = f"Hotels in {params.get('q')}" if params.get('q') else 'Hotels'
+    if params.get('check_in_date') and params.get('check_out_date'):
+        title += f" ({params['check_in_date']} to {params['check_out_date']})"
+    return title
+
+
+def collect_results(messages: list[AnyMessage]) -> tuple[list, list]:
+    '''
+    Flight and hotel sections from the tool results of the latest user turn,
+    taken from the ToolMessage artifacts the Agent keeps alongside the
+    compacted content.
+    '''
+    start = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=0)
+    calls = {c['id']: c for m in messages[start:] for c in getattr(m, 'tool_calls', None) or ()}
+    flights, hotels = [], []
+    for message in messages[start:]:
+        if not isinstance(message, ToolMessage) or not isinstance(message.artifact, dict):
+            continue
+        options = message.artifact.get('result')
+        if not isinstance(options, list) or not options:
+            continue
+        args = (calls.get(message.tool_call_id) or {}).get('args') or {}
+        if message.name == 'flights_finder':
+            flights.append({'title': _flight_title(args, options), 'options': options})
+        elif message.name == 'hotels_finder':
+            hotels.append({'title': _hotel_title(args), 'options': options})
+    return flights, hotels
+
+
+def render_email(messages: list[AnyMessage], title: str = 'Flight and Hotel Options') -> str:
+    flights, hotels = collect_results(messages)
+    summary = messages[-1].content if messages else ''
+    return _template.render(title=title, summary=summary, flights=flights, hotels=hotels)
@@ -0,0 +1,108 @@
+import os
+from typing import Optional
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_openai import ChatOpenAI
+
+from agents.llm_cache import get_llm_cache
+from agents.telemetry import record_llm_usage, upstream_call
+from agents.usage import llm_usage
+
+HISTORY_TURNS = int(os.getenv('AGENT_HISTORY_TURNS', '6'))
+HISTORY_SUMMARY = os.getenv('AGENT_HISTORY_SUMMARY', '1') not in ('0', 'false', 'False')
+SUMMARY_MODEL = os.getenv('AGENT_SUMMARY_MODEL', 'gpt-4o-mini')
+MAX_SUMMARY_INPUT_CHARS = 2000
+
+SUMMARY_PROMPT = """You maintain the running summary of a travel planning conversation.
+Merge the new messages into the existing summary. Keep everything needed to continue the
+conversation: origin, destination, dates, travelers, budget, preferences, and the flights and
+hotels already found with their prices and links. Drop small talk. Answer with the summary only."""
+
+
+def window_start(messages: list[AnyMessage], keep_turns: int) -> int:
+    '''
+    Index of the first message of the last `keep_turns` turns. Turns start at
+    human messages, so an AI tool call and its ToolMessages are never split.
+    '''
+    if keep_turns <= 0:
+        return 0
+    starts = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+    if len(starts) <= keep_turns:
+        return 0
+    return starts[-keep_turns]
+
+
+def _render(message: AnyMessage) -> str:
+    if isinstance(message, HumanMessage):
+        return f'User: {message.content}'
+    if isinstance(message, ToolMessage):
+        return f'Tool {message.name}: {str(message.content)[:MAX_SUMMARY_INPUT_CHARS]}'
+    if isinstance(message, AIMessage):
+        calls = ', '.join(f"{c['name']}({c['args']})" for c in message.tool_calls)
+        text = f'Assistant: {message.content}' if message.content else 'Assistant:'
+        return f'{text} [called {calls}]' if calls else text
+    return f'{message.type}: {message.content}'
+
+
+class HistoryManager:
+    '''
+    Keeps the last `keep_turns` turns verbatim and folds everything older into
+    a rolling summary held in the graph state (`summary`, plus `summary_upto`,
+    the number of leading messages it covers). Each call only summarizes the
+    messages that slid out of the window since the last one.
+    '''
+
+    def __init__(self, keep_turns: int = HISTORY_TURNS, summarize: bool = HISTORY_SUMMARY,
+                 llm: Optional[ChatOpenAI] = None):
+        self.keep_turns = keep_turns
+        self.summarize = summarize
+        self._llm = llm
+
+    @property
+    def llm(self) -> ChatOpenAI:
+        if self._llm is None:
+            self._llm = ChatOpenAI(model=SUMMARY_MODEL, temperature=0, cache=get_llm_cache())
+        return self._llm
+
+    def _summary_request(self, state: dict, start: int) -> Optional[list[AnyMessage]]:
+        summary_upto = state.get('summary_upto') or 0
+        if not self.summarize or start <= summary_upto:
+            return None
+        new = '\n'.join(_render(m) for m in state['messages'][summary_upto:start])
+        return [SystemMessage(content=SUMMARY_PROMPT),
+                HumanMessage(content=f"Existing summary:\n{state.get('summary') or '(none)'}\n\nNew messages:\n{new}")]
+
+    def _result(self, state: dict, start: int, message: Optional[AIMessage]):
+        if message is None:
+            return state['messages'][start:], {}
+        update = {'summary': message.content, 'summary_upto': start,
+                  'usage': llm_usage(SUMMARY_MODEL, message)}
+        return state['messages'][start:], update
+
+    def prepare(self, state: dict):
+        '''Return the messages to send (without the system prompt) and the state update, usage included.'''
+        start = window_start(state['messages'], self.keep_turns)
+        request = self._summary_request(state, start)
+        message = None
+        if request:
+            with upstream_call('openai', 'chat', model=SUMMARY_MODEL, node='summary'):
+                message = self.llm.invoke(request)
+            record_llm_usage(SUMMARY_MODEL, 'summary', message)
+        return self._result(state, start, message)
+
+    async def aprepare(self, state: dict):
+        start = window_start(state['messages'], self.keep_turns)
+        request = self._summary_request(state, start)
+        message = None
+        if request:
+            with upstream_call('openai', 'chat', model=SUMMARY_MODEL, node='summary'):
+                message = await self.llm.ainvoke(request)
+            record_llm_usage(SUMMARY_MODEL, 'summary', message)
+        return self._result(state, start, message)
+
+    @staticmethod
+    def system_prompt(prompt: str, state: dict, update: dict) -> str:
+        summary = update.get('summary', state.get('summary'))
+        if not summary:
+            return prompt
+        return f'{prompt}\n\nSummary of the earlier conversation:\n{summary}'
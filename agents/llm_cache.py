@@ -0,0 +1,248 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Sequence
+
+from dotenv import load_dotenv
+from langchain_core._api import suppress_langchain_beta_warning
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+load_dotenv()
+
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', '1') not in ('0', 'false', 'False')
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '512'))
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH')
+LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', '86400'))
+# Rows kept in the SQLite file; the least recently used are pruned first.
+LLM_CACHE_MAX_DISK_ENTRIES = int(os.getenv('LLM_CACHE_MAX_DISK_ENTRIES', '20000'))
+
+# Bump when the serialized response format changes so a shared SQLite file
+# written by an older release is not read back with the new loader.
+CACHE_SCHEMA = 1
+
+
+def content_key(namespace: str, *parts) -> str:
+    '''sha256 over everything that can change the model's answer.'''
+    payload = json.dumps([CACHE_SCHEMA, namespace, *parts], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseStore:
+    '''
+    In-memory LRU of serialized model responses with a TTL and an optional
+    SQLite write-through store shared by every worker pointing at the same file.
+
+    Values are opaque text; the LangChain and pydantic-ai adapters own the
+    (de)serialization, so every hit hands out fresh message objects.
+    '''
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, path: Optional[str] = LLM_CACHE_PATH,
+                 ttl: float = LLM_CACHE_TTL, max_disk_entries: int = LLM_CACHE_MAX_DISK_ENTRIES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'disk_hits': 0}
+        if path:
+            self._open_db(path)
+
+    def _open_db(self, path: str):
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS llm_cache ('
+            'key TEXT PRIMARY KEY, namespace TEXT, expires_at REAL NOT NULL, accessed_at REAL NOT NULL, '
+            'payload TEXT NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS llm_cache_accessed_at ON llm_cache (accessed_at)')
+
+    @property
+    def persistent(self) -> bool:
+        return self._db is not None
+
+    def _memory_get(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def _memory_put(self, key: str, expires_at: float, payload: str):
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def _disk_get(self, key: str, now: float) -> Optional[tuple[float, str]]:
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute(
+                'SELECT expires_at, payload FROM llm_cache WHERE key = ? AND expires_at > ?', (key, now)
+            ).fetchone()
+            if row is not None:
+                self._db.execute('UPDATE llm_cache SET accessed_at = ? WHERE key = ?', (now, key))
+        return row
+
+    def _disk_put(self, key: str, namespace: str, expires_at: float, payload: str):
+        if self._db is None:
+            return
+        now = time.time()
+        with self._db_lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO llm_cache (key, namespace, expires_at, accessed_at, payload) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, namespace, expires_at, now, payload),
+            )
+            self._writes += 1
+            if self._writes % 256 == 0:
+                self._db.execute('DELETE FROM llm_cache WHERE expires_at <= ?', (now,))
+                self._db.execute(
+                    'DELETE FROM llm_cache WHERE key IN '
+                    '(SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                    (self.max_disk_entries,),
+                )
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        payload = self._memory_get(key, now)
+        if payload is None:
+            row = self._disk_get(key, now)
+            if row is not None:
+                expires_at, payload = row
+                self._memory_put(key, expires_at, payload)
+                self.stats['disk_hits'] += 1
+        if payload is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return payload
+
+    def set(self, key: str, payload: str, namespace: str = ''):
+        expires_at = time.time() + self.ttl
+        self._memory_put(key, expires_at, payload)
+        self._disk_put(key, namespace, expires_at, payload)
+        self.stats['stores'] += 1
+
+    async def aget(self, key: str) -> Optional[str]:
+        if self._db is None:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, payload: str, namespace: str = ''):
+        if self._db is None:
+            return self.set(key, payload, namespace)
+        return await asyncio.to_thread(self.set, key, payload, namespace)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute('DELETE FROM llm_cache')
+
+    def close(self):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+
+# Message fields LangChain serializes that are never sent to the model; run
+# ids and usage of earlier replies would otherwise make every thread unique.
+LOCAL_MESSAGE_FIELDS = ('id', 'response_metadata', 'usage_metadata')
+
+
+def _normalize_prompt(prompt: str) -> list:
+    messages = json.loads(prompt)
+    for message in messages:
+        fields = message.get('kwargs') if isinstance(message, dict) else None
+        if fields:
+            for field in LOCAL_MESSAGE_FIELDS:
+                fields.pop(field, None)
+    return messages
+
+
+class LLMResponseCache(BaseCache):
+    '''
+    LangChain cache over a ResponseStore. LangChain passes the serialized
+    messages as `prompt` and the model name, call parameters and bound tools
+    as `llm_string`, so both go into the key. Replayed messages are marked
+    with `response_metadata['cache_hit'] = True`.
+    '''
+
+    def __init__(self, store: ResponseStore):
+        self.store = store
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return content_key('langchain', llm_string, _normalize_prompt(prompt))
+
+    @staticmethod
+    def _load(payload: Optional[str]) -> Optional[Sequence]:
+        if payload is None:
+            return None
+        with suppress_langchain_beta_warning():
+            generations = loads(payload)
+        for generation in generations:
+            message = getattr(generation, 'message', None)
+            if message is not None:
+                message.response_metadata['cache_hit'] = True
+        return generations
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence]:
+        return self._load(self.store.get(self._key(prompt, llm_string)))
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence):
+        self.store.set(self._key(prompt, llm_string), dumps(list(return_val)), 'langchain')
+
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[Sequence]:
+        return self._load(await self.store.aget(self._key(prompt, llm_string)))
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: Sequence):
+        await self.store.aset(self._key(prompt, llm_string), dumps(list(return_val)), 'langchain')
+
+    def clear(self, **kwargs: Any):
+        self.store.clear()
+
+
+_store: Optional[ResponseStore] = None
+_cache: Optional[LLMResponseCache] = None
+
+
+def get_response_store() -> Optional[ResponseStore]:
+    '''Store shared by the LangChain and pydantic-ai caches; None when disabled.'''
+    global _store
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _store is None:
+        _store = ResponseStore()
+    return _store
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    global _cache
+    store = get_response_store()
+    if store is None:
+        return None
+    if _cache is None:
+        _cache = LLMResponseCache(store)
+    return _cache
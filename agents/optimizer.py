@@ -0,0 +1,167 @@
+import bisect
+import heapq
+import re
+from typing import Optional
+
+import numpy as np
+
+from agents.ranking import rank
+
+# How much each leg's ranking score counts towards a bundle's utility.
+LEG_WEIGHTS = {'flights': 1.0, 'hotels': 1.0, 'activities': 0.5}
+
+
+def prune_dominated(costs: np.ndarray, utilities: np.ndarray, k: int) -> np.ndarray:
+    '''
+    Indices of the candidates that fewer than `k` others dominate (cost no
+    higher, utility no lower, one of them strictly). A candidate beaten by
+    k others can never appear in the top k bundles: swapping in each of
+    them gives k bundles that cost no more and score no less.
+    '''
+    cheaper = costs[None, :] <= costs[:, None]
+    better = utilities[None, :] >= utilities[:, None]
+    strict = (costs[None, :] < costs[:, None]) | (utilities[None, :] > utilities[:, None])
+    return np.flatnonzero((cheaper & better & strict).sum(axis=1) < k)
+
+
+class _Leg:
+    '''Candidates of one leg, ordered by utility, plus a cost-indexed utility bound.'''
+
+    def __init__(self, costs: np.ndarray, utilities: np.ndarray, index: np.ndarray):
+        by_utility = np.argsort(-utilities, kind='stable')
+        self.costs = costs[by_utility].tolist()
+        self.utilities = utilities[by_utility].tolist()
+        self.index = index[by_utility].tolist()
+        self.min_cost = float(costs.min())
+        self.max_utility = float(utilities.max())
+        by_cost = np.argsort(costs, kind='stable')
+        self._sorted_costs = costs[by_cost].tolist()
+        self._best_within = np.maximum.accumulate(utilities[by_cost]).tolist()
+
+    def best_within(self, budget: float) -> Optional[float]:
+        '''Highest utility of any candidate costing at most `budget`.'''
+        position = bisect.bisect_right(self._sorted_costs, budget)
+        return self._best_within[position - 1] if position else None
+
+
+def top_bundles(legs: list[tuple[np.ndarray, np.ndarray]], budget: float, k: int = 5) -> list[tuple]:
+    '''
+    Multiple-choice knapsack: pick one candidate per leg so that the total
+    cost stays within `budget`, and return the `k` highest-utility picks as
+    (utility, cost, [candidate index per leg]), best first.
+
+    Each leg is first cut down with `prune_dominated`; the search is then a
+    depth-first branch and bound that tries candidates in utility order and
+    stops a branch once even the best affordable remainder cannot beat the
+    current k-th bundle, or the cheapest remainder no longer fits.
+    '''
+    if k <= 0 or not legs or any(len(costs) == 0 for costs, _ in legs):
+        return []
+    prepared = []
+    for costs, utilities in legs:
+        costs, utilities = np.asarray(costs, dtype=float), np.asarray(utilities, dtype=float)
+        keep = prune_dominated(costs, utilities, k)
+        prepared.append(_Leg(costs[keep], utilities[keep], keep))
+
+    count = len(prepared)
+    min_rest = [0.0] * (count + 1)
+    max_rest = [0.0] * (count + 1)
+    for i in range(count - 1, -1, -1):
+        min_rest[i] = min_rest[i + 1] + prepared[i].min_cost
+        max_rest[i] = max_rest[i + 1] + prepared[i].max_utility
+
+    def bound(leg: int, remaining: float) -> Optional[float]:
+        # Optimistic: each remaining leg takes its best candidate that fits
+        # the whole remaining budget on its own.
+        total = 0.0
+        for i in range(leg, count):
+            best = prepared[i].best_within(remaining - (min_rest[leg] - prepared[i].min_cost))
+            if best is None:
+                return None
+            total += best
+        return total
+
+    heap: list[tuple] = []  # (utility, -cost, picks) min-heap of the best k so far
+    picks = [0] * count
+
+    def search(leg: int, cost: float, utility: float):
+        if leg == count:
+            entry = (utility, -cost, list(picks))
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+            return
+        current = prepared[leg]
+        for position in range(len(current.costs)):
+            item_utility = current.utilities[position]
+            if len(heap) == k and utility + item_utility + max_rest[leg + 1] <= heap[0][0]:
+                break  # candidates only get worse from here
+            item_cost = cost + current.costs[position]
+            if item_cost + min_rest[leg + 1] > budget:
+                continue
+            if len(heap) == k and leg + 1 < count:
+                rest = bound(leg + 1, budget - item_cost)
+                if rest is None or utility + item_utility + rest <= heap[0][0]:
+                    continue
+            picks[leg] = current.index[position]
+            search(leg + 1, item_cost, utility + item_utility)
+
+    search(0, 0.0, 0.0)
+    return [(utility, -negative_cost, chosen) for utility, negative_cost, chosen in sorted(heap, reverse=True)]
+
+
+def _activity_cost(activity: dict) -> float:
+    # Places only carry a price label ('$$', '$10-20'); take the first amount
+    # when there is one and treat price levels without amounts as free.
+    match = re.search(r'\d+(?:\.\d+)?', str(activity.get('price') or ''))
+    return float(match.group()) if match else 0.0
+
+
+def _hotel_cost(hotel: dict, nights: int) -> float:
+    if hotel.get('total_price') is not None:
+        return float(hotel['total_price'])
+    if hotel.get('price_per_night') is not None:
+        return float(hotel['price_per_night']) * max(nights, 1)
+    return np.nan
+
+
+def best_bundles(flights: Optional[list], hotels: Optional[list], activities: Optional[list],
+                 budget: float, nights: int = 1, k: int = 5, leg_weights: Optional[dict] = None) -> list[dict]:
+    '''
+    Top `k` flight + hotel (+ activity) bundles within the total budget.
+
+    Candidates are scored within their leg by `ranking.rank`; a bundle's
+    utility is the leg-weighted sum of those scores. Candidates without a
+    price are left out, and so is a leg with no priced candidates (a failed
+    search, say), so bundles are built from the legs that have some.
+    '''
+    weights = {**LEG_WEIGHTS, **(leg_weights or {})}
+    # A failed tool returns its error message instead of a list
+    candidates = {name: rank(items if isinstance(items, list) else [], name)
+                  for name, items in (('flights', flights), ('hotels', hotels), ('activities', activities))}
+    costs = {
+        'flights': lambda f: f.get('price') if f.get('price') is not None else np.nan,
+        'hotels': lambda h: _hotel_cost(h, nights),
+        'activities': _activity_cost,
+    }
+
+    legs, names = [], []
+    for name, items in candidates.items():
+        leg_costs = np.array([costs[name](item) for item in items], dtype=float)
+        priced = np.flatnonzero(~np.isnan(leg_costs))
+        if not len(priced):
+            continue
+        candidates[name] = [items[i] for i in priced]
+        utilities = np.array([items[i]['score'] for i in priced], dtype=float) * weights[name]
+        legs.append((leg_costs[priced], utilities))
+        names.append(name)
+
+    singular = {'flights': 'flight', 'hotels': 'hotel', 'activities': 'activity'}
+    bundles = []
+    for utility, cost, picks in top_bundles(legs, budget, k):
+        bundle = {singular[name]: candidates[name][pick] for name, pick in zip(names, picks)}
+        bundle['total_price'] = round(cost, 2)
+        bundle['score'] = round(utility, 4)
+        bundles.append(bundle)
+    return bundles
@@ -0,0 +1,78 @@
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import AsyncIterator, Optional
+
+import pydantic
+from pydantic_ai.messages import ModelMessage, ModelMessagesTypeAdapter, ModelResponse
+from pydantic_ai.models import AgentModel, EitherStreamedResponse, KnownModelName, Model, infer_model
+from pydantic_ai.settings import ModelSettings
+from pydantic_ai.tools import ToolDefinition
+from pydantic_ai.usage import Usage
+
+from agents.llm_cache import ResponseStore, content_key, get_response_store
+
+_response_adapter = pydantic.TypeAdapter(ModelResponse)
+
+
+def _without_timestamps(value):
+    if isinstance(value, dict):
+        return {k: _without_timestamps(v) for k, v in value.items() if k != 'timestamp'}
+    if isinstance(value, list):
+        return [_without_timestamps(v) for v in value]
+    return value
+
+
+class CachedAgentModel(AgentModel):
+    '''
+    Answers a request from the response store when the same model, tools and
+    message history were seen before. A hit reports an empty Usage, so run
+    usage limits and token accounting only count real model calls.
+    '''
+
+    def __init__(self, wrapped: AgentModel, store: ResponseStore, signature: list):
+        self.wrapped = wrapped
+        self.store = store
+        self.signature = signature
+
+    def _key(self, messages: list[ModelMessage], model_settings: Optional[ModelSettings]) -> str:
+        # Timestamps differ on every run without changing what the model is sent
+        history = _without_timestamps(ModelMessagesTypeAdapter.dump_python(messages, mode='json'))
+        return content_key('pydantic-ai', self.signature, history, dict(model_settings or {}))
+
+    async def request(self, messages: list[ModelMessage],
+                      model_settings: Optional[ModelSettings]) -> tuple[ModelResponse, Usage]:
+        key = self._key(messages, model_settings)
+        payload = await self.store.aget(key)
+        if payload is not None:
+            return _response_adapter.validate_json(payload), Usage()
+        response, usage = await self.wrapped.request(messages, model_settings)
+        await self.store.aset(key, _response_adapter.dump_json(response).decode(), 'pydantic-ai')
+        return response, usage
+
+    @asynccontextmanager
+    async def request_stream(self, messages: list[ModelMessage],
+                             model_settings: Optional[ModelSettings]) -> AsyncIterator[EitherStreamedResponse]:
+        # Streams are passed through; only complete responses are cached
+        async with self.wrapped.request_stream(messages, model_settings) as response:
+            yield response
+
+
+class CachedModel(Model):
+    '''pydantic-ai model wrapper that puts the shared LLM response cache in front of `model`.'''
+
+    def __init__(self, model: Model | KnownModelName, store: Optional[ResponseStore] = None):
+        self.wrapped = infer_model(model)
+        self.store = store if store is not None else get_response_store()
+
+    async def agent_model(self, *, function_tools: list[ToolDefinition], allow_text_result: bool,
+                          result_tools: list[ToolDefinition]) -> AgentModel:
+        agent_model = await self.wrapped.agent_model(function_tools=function_tools,
+                                                     allow_text_result=allow_text_result, result_tools=result_tools)
+        if self.store is None:
+            return agent_model
+        signature = [self.name(), [asdict(t) for t in function_tools], allow_text_result,
+                     [asdict(t) for t in result_tools]]
+        return CachedAgentModel(agent_model, self.store, signature)
+
+    def name(self) -> str:
+        return self.wrapped.name()
@@ -0,0 +1,161 @@
+from typing import Optional
+
+import logfire
+import numpy as np
+
+# Criterion -> direction; +1 means higher is better.
+CRITERIA = {
+    'price': -1,
+    'duration': -1,
+    'stops': -1,
+    'rating': 1,
+    'distance': -1,
+}
+SORT_KEYS = ('score', *CRITERIA)
+
+# Record field behind each criterion, per result kind. `distance` is derived
+# from latitude/longitude for the kinds that have coordinates.
+FIELDS = {
+    'flights': {'price': 'price', 'duration': 'total_duration', 'stops': 'stops'},
+    'hotels': {'price': 'price_per_night', 'rating': 'rating'},
+    'activities': {'rating': 'rating'},
+}
+LOCATED = ('hotels', 'activities')
+
+DEFAULT_WEIGHTS = {
+    'flights': {'price': 1.0, 'duration': 0.4, 'stops': 0.3},
+    'hotels': {'price': 1.0, 'rating': 0.6, 'distance': 0.2},
+    'activities': {'rating': 1.0, 'distance': 0.2},
+}
+
+EARTH_RADIUS_KM = 6371.0
+# Rows compared against the whole set at once in the dominance check, which
+# bounds its scratch memory to a few PARETO_CHUNK x n boolean matrices.
+PARETO_CHUNK = 256
+
+
+def criteria(kind: str) -> set[str]:
+    '''Criteria results of `kind` can be scored and sorted by.'''
+    return set(FIELDS[kind]) | ({'distance'} if kind in LOCATED else set())
+
+
+def _number(value) -> float:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return np.nan
+
+
+def _column(items: list[dict], field: str) -> np.ndarray:
+    return np.fromiter((_number(item.get(field)) for item in items), dtype=float, count=len(items))
+
+
+def _distances(items: list[dict], near: Optional[tuple]) -> np.ndarray:
+    '''Great-circle km to `near`, or to the median position of the results when not given.'''
+    lat, lon = _column(items, 'latitude'), _column(items, 'longitude')
+    if near is None:
+        if np.isnan(lat).all():
+            return lat
+        near = (np.nanmedian(lat), np.nanmedian(lon))
+    lat0, lon0 = np.radians(near[0]), np.radians(near[1])
+    lat, lon = np.radians(lat), np.radians(lon)
+    a = np.sin((lat - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lat) * np.sin((lon - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def columns(items: list[dict], kind: str, price_field: Optional[str] = None,
+            near: Optional[tuple] = None) -> dict[str, np.ndarray]:
+    fields = dict(FIELDS[kind])
+    if price_field:
+        fields['price'] = price_field
+    data = {name: _column(items, field) for name, field in fields.items()}
+    if kind in LOCATED:
+        data['distance'] = _distances(items, near)
+    return data
+
+
+def pareto_mask(costs: np.ndarray) -> np.ndarray:
+    '''
+    Rows of an (n, k) cost matrix (lower is better, no NaN) that no other row
+    dominates, i.e. is at least as good on every criterion and better on one.
+    '''
+    n, k = costs.shape
+    dominated = np.zeros(n, dtype=bool)
+    for start in range(0, n, PARETO_CHUNK):
+        block = costs[start:start + PARETO_CHUNK]
+        # One (block, n) comparison per criterion; k is small, n is not.
+        no_worse = np.ones((len(block), n), dtype=bool)
+        better = np.zeros((len(block), n), dtype=bool)
+        for j in range(k):
+            mine, theirs = block[:, j, None], costs[None, :, j]
+            no_worse &= theirs <= mine
+            better |= theirs < mine
+        dominated[start:start + len(block)] = (no_worse & better).any(axis=1)
+    return ~dominated
+
+
+def rank(items: list[dict], kind: str, weights: Optional[dict] = None, sort: str = 'score',
+         budget: Optional[float] = None, price_field: Optional[str] = None, near: Optional[tuple] = None,
+         pareto_only: bool = False, limit: Optional[int] = None) -> list[dict]:
+    '''
+    Filter results to `budget`, score them and mark the Pareto-optimal set.
+
+    Each criterion is min-max scaled over the results within budget to a
+    0..1 goodness (missing values count as worst); the score is the
+    weighted mean of the goodness columns with non-zero weight, and the
+    Pareto set is taken over the same columns. Results come back as copies
+    with `score` and `pareto` added, ordered by `sort`: the score, or one
+    criterion in its natural direction with the score breaking ties.
+    '''
+    if kind not in FIELDS:
+        raise ValueError(f'Unknown result kind: {kind}')
+    if sort not in SORT_KEYS:
+        raise ValueError(f'Unknown sort key: {sort}')
+    weights = dict(DEFAULT_WEIGHTS[kind] if weights is None else weights)
+    unknown = set(weights) - set(CRITERIA)
+    if unknown:
+        raise ValueError(f"Unknown ranking criteria: {', '.join(sorted(unknown))}")
+
+    items = [item for item in items if isinstance(item, dict)]
+    if not items:
+        return []
+    with logfire.span('rank {kind}', kind=kind, candidates=len(items), sort=sort):
+        return _rank(items, kind, weights, sort, budget, price_field, near, pareto_only, limit)
+
+
+def _rank(items: list[dict], kind: str, weights: dict, sort: str, budget: Optional[float],
+          price_field: Optional[str], near: Optional[tuple], pareto_only: bool, limit: Optional[int]) -> list[dict]:
+    data = columns(items, kind, price_field, near)
+    if sort != 'score' and sort not in data:
+        raise ValueError(f'{kind} cannot be sorted by {sort}')
+
+    keep = np.ones(len(items), dtype=bool)
+    if budget is not None:
+        # NaN compares False: results without a price never pass a budget
+        keep = data['price'] <= budget
+    index = np.flatnonzero(keep)
+    if not len(index):
+        return []
+
+    active = [name for name in data
+              if weights.get(name, 0) > 0 and not np.isnan(data[name][index]).all()]
+    goodness = np.zeros((len(index), len(active)))
+    for j, name in enumerate(active):
+        values = data[name][index] * CRITERIA[name]
+        low, high = np.nanmin(values), np.nanmax(values)
+        scaled = (values - low) / (high - low) if high > low else np.ones_like(values)
+        goodness[:, j] = np.nan_to_num(scaled, nan=0.0)
+
+    w = np.array([weights[name] for name in active])
+    score = goodness @ w / w.sum() if active else np.zeros(len(index))
+    front = pareto_mask(1.0 - goodness)
+
+    if pareto_only:
+        index, score, front = index[front], score[front], front[front]
+    if sort == 'score':
+        order = np.argsort(-score, kind='stable')
+    else:
+        key = np.nan_to_num(data[sort][index] * -CRITERIA[sort], nan=np.inf)
+        order = np.lexsort((-score, key))
+    if limit is not None:
+        order = order[:limit]
+    return [{**items[index[i]], 'score': round(float(score[i]), 4), 'pareto': bool(front[i])} for i in order]
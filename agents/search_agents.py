@@ -1,19 +1,32 @@
-from datetime import date
+import asyncio
+import os
+from datetime import date, timedelta
 from typing import Optional, List
 from langchain_openai import ChatOpenAI
-from agents.tools.flights_finder import flights_finder, FlightsInput, FlightsInputSchema
+from agents.tools.flights_finder import flights_finder, acached_flights, FlightsInput, FlightsInputSchema
+from agents.tools.hotels_finder import hotels_finder
+from agents.tools.activities_finder import activities_finder
+from agents.ranking import rank
+
+CALENDAR_CONCURRENCY = int(os.getenv("CALENDAR_CONCURRENCY", "6"))
+
+def _min_price(flights) -> Optional[float]:
+    prices = [f["price"] for f in flights if isinstance(f, dict) and f.get("price") is not None]
+    return min(prices) if prices else None
 
 class BaseSearchAgent:
-    def __init__(self):
-        self.llm = ChatOpenAI(model='gpt-4')
+    def __init__(self, llm: Optional[ChatOpenAI] = None):
+        # Long-lived callers (the API registry) pass one shared client in
+        self.llm = llm if llm is not None else ChatOpenAI(model='gpt-4')
 
 class FlightSearchAgent(BaseSearchAgent):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, llm: Optional[ChatOpenAI] = None):
+        super().__init__(llm)
         self.tool = flights_finder
 
     async def search(self, departure: str, arrival: str, start_date: date, 
-                    end_date: date, budget: float, travelers: int = 1) -> List[dict]:
+                    end_date: date, budget: float, travelers: int = 1, sort: str = "score",
+                    weights: Optional[dict] = None, pareto_only: bool = False) -> List[dict]:
         input_data = {
             "params": {
                 "departure_airport": departure,
@@ -28,22 +41,21 @@ class FlightSearchAgent(BaseSearchAgent):
         }
 
         try:
-            results = self.tool(input_data)
+            results = await self.tool.ainvoke(input_data)
             
             if isinstance(results, str):  # Error case
                 print(f"Search error: {results}")
                 return {"error": results, "flights": []}
                 
-            # Filter by budget and add booking URL
-            filtered_flights = []
-            for flight in results:
-                if flight.get('price', float('inf')) <= budget:
-                    # Construct Google Flights URL
-                    base_url = "https://www.google.com/travel/flights"
-                    params = f"?q=Flights%20from%20{departure}%20to%20{arrival}"
-                    flight['booking_url'] = base_url + params
-                    filtered_flights.append(flight)
-                    
+            # Filter by budget, rank and add booking URL
+            filtered_flights = rank(results, "flights", weights=weights, sort=sort, budget=budget,
+                                    pareto_only=pareto_only)
+            base_url = "https://www.google.com/travel/flights"
+            params = f"?q=Flights%20from%20{departure}%20to%20{arrival}"
+            for flight in filtered_flights:
+                # Construct Google Flights URL
+                flight['booking_url'] = base_url + params
+
             print(f"Found {len(filtered_flights)} flights within budget")
             return {
                 "flights": filtered_flights
@@ -52,30 +64,113 @@ class FlightSearchAgent(BaseSearchAgent):
             print(f"Exception in flight search: {str(e)}")
             return {"error": str(e), "flights": []}
 
+    async def price_calendar(self, departure: str, arrival: str, start_date: date, end_date: date,
+                             flex_days: int = 3, budget: Optional[float] = None, travelers: int = 1,
+                             stop_when_within_budget: bool = True, concurrency: int = CALENDAR_CONCURRENCY) -> dict:
+        """
+        Minimum round-trip price for every outbound/return pair within
+        +/- flex_days of the requested dates.
+
+        Cached cells are filled first without going upstream. The rest are
+        fetched in waves of `concurrency`, cheapest-looking first (estimated
+        from the nearest known cell, then by distance from the requested
+        dates). With a budget and stop_when_within_budget, no new wave starts
+        once a fare within budget has been found; unfetched cells stay None.
+        """
+        outbound_dates = [start_date + timedelta(days=d) for d in range(-flex_days, flex_days + 1)]
+        return_dates = [end_date + timedelta(days=d) for d in range(-flex_days, flex_days + 1)]
+        cells = [(o, r) for o in range(len(outbound_dates)) for r in range(len(return_dates))
+                 if return_dates[r] >= outbound_dates[o]]
+
+        def cell_input(cell):
+            o, r = cell
+            return FlightsInput(
+                departure_airport=departure,
+                arrival_airport=arrival,
+                outbound_date=str(outbound_dates[o]),
+                return_date=str(return_dates[r]),
+                adults=travelers
+            )
+
+        prices = {}
+        cached = await asyncio.gather(*(acached_flights(cell_input(cell)) for cell in cells))
+        for cell, flights in zip(cells, cached):
+            if flights is not None:
+                prices[cell] = _min_price(flights)
+        cached_count = len(prices)
+
+        def settled():
+            return (budget is not None and stop_when_within_budget
+                    and any(p is not None and p <= budget for p in prices.values()))
+
+        def estimate(cell):
+            known = [(abs(cell[0] - k[0]) + abs(cell[1] - k[1]), p) for k, p in prices.items() if p is not None]
+            nearest = min(known)[1] if known else None
+            distance = abs(cell[0] - flex_days) + abs(cell[1] - flex_days)
+            return (nearest is None, nearest or 0, distance)
+
+        async def fetch(cell):
+            flights = await self.tool.ainvoke({"params": cell_input(cell).model_dump()})
+            if isinstance(flights, str):  # Error case
+                print(f"Calendar cell error: {flights}")
+                return None
+            return _min_price(flights)
+
+        pending = [cell for cell in cells if cell not in prices]
+        fetched_count = 0
+        while pending and not settled():
+            pending.sort(key=estimate)
+            wave, pending = pending[:concurrency], pending[concurrency:]
+            for cell, price in zip(wave, await asyncio.gather(*(fetch(cell) for cell in wave))):
+                prices[cell] = price
+            fetched_count += len(wave)
+
+        matrix = [[prices.get((o, r)) for r in range(len(return_dates))] for o in range(len(outbound_dates))]
+        known = [(p, cell) for cell, p in prices.items() if p is not None]
+        cheapest = None
+        if known:
+            price, (o, r) = min(known)
+            cheapest = {"outbound_date": str(outbound_dates[o]), "return_date": str(return_dates[r]), "price": price}
+        return {
+            "outbound_dates": [str(d) for d in outbound_dates],
+            "return_dates": [str(d) for d in return_dates],
+            "prices": matrix,
+            "cheapest": cheapest,
+            "within_budget": cheapest is not None and budget is not None and cheapest["price"] <= budget,
+            "cells": {"total": len(cells), "cached": cached_count, "fetched": fetched_count,
+                      "skipped": len(pending)}
+        }
+
 class HotelSearchAgent(BaseSearchAgent):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, llm: Optional[ChatOpenAI] = None):
+        super().__init__(llm)
         self.tool = hotels_finder
 
     async def search(self, city: str, start_date: date, end_date: date, 
-                    budget: float, travelers: int = 1, rooms: int = 1) -> List[dict]:
+                    budget: float, travelers: int = 1, rooms: int = 1, sort: str = "score",
+                    weights: Optional[dict] = None, pareto_only: bool = False) -> List[dict]:
         # Calculate daily budget
         days = (end_date - start_date).days
         daily_budget = budget / days
 
-        results = self.tool({
-            "q": city,
-            "check_in_date": str(start_date),
-            "check_out_date": str(end_date),
-            "adults": travelers,
-            "rooms": rooms
+        results = await self.tool.ainvoke({
+            "params": {
+                "q": city,
+                "check_in_date": str(start_date),
+                "check_out_date": str(end_date),
+                "adults": travelers,
+                "rooms": rooms
+            }
         })
+        if isinstance(results, str):  # Error case
+            raise RuntimeError(results)
 
-        return [hotel for hotel in results if hotel.get('price_per_night', float('inf')) <= daily_budget]
+        return rank(results, "hotels", weights=weights, sort=sort, budget=daily_budget,
+                    price_field="price_per_night", pareto_only=pareto_only)
 
 class ActivitySearchAgent(BaseSearchAgent):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, llm: Optional[ChatOpenAI] = None):
+        super().__init__(llm)
         self.tool = activities_finder
 
     async def search(self, city: str, start_date: date, end_date: date, 
@@ -84,11 +179,13 @@ class ActivitySearchAgent(BaseSearchAgent):
         days = (end_date - start_date).days
         daily_budget = budget / days
 
-        results = self.tool({
-            "location": city,
-            "date": str(start_date),
-            "budget": "high" if daily_budget > 200 else "medium" if daily_budget > 100 else "low",
-            "type": activity_type
+        results = await self.tool.ainvoke({
+            "params": {
+                "location": city,
+                "date": str(start_date),
+                "budget": "high" if daily_budget > 200 else "medium" if daily_budget > 100 else "low",
+                "activity_type": activity_type
+            }
         })
 
         return results
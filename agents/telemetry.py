@@ -0,0 +1,176 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import logfire
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+
+from agents.llm_cache import get_response_store
+from agents.tools.search_cache import get_cache
+from agents.usage import cost_usd
+
+SERVICE_NAME = os.getenv('SERVICE_NAME', 'tripsy-agent-api')
+# Spans go to Logfire only when LOGFIRE_TOKEN is set; TRACE_CONSOLE=1 also
+# prints them, which is handy locally and far too noisy under load.
+TRACE_CONSOLE = os.getenv('TRACE_CONSOLE', '0') not in ('0', 'false', 'False')
+
+logfire.configure(send_to_logfire='if-token-present', service_name=SERVICE_NAME,
+                  console=None if TRACE_CONSOLE else False)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+
+UPSTREAM_LATENCY = Histogram(
+    'tripsy_upstream_request_seconds', 'Latency of calls to SerpAPI and OpenAI',
+    ['upstream', 'operation', 'outcome'], buckets=LATENCY_BUCKETS)
+LLM_TOKENS = Histogram(
+    'tripsy_llm_tokens', 'Tokens per LLM call', ['model', 'kind'], buckets=TOKEN_BUCKETS)
+TOOL_LATENCY = Histogram(
+    'tripsy_tool_call_seconds', 'Agent tool call latency', ['tool', 'outcome'], buckets=LATENCY_BUCKETS)
+HTTP_LATENCY = Histogram(
+    'tripsy_http_request_seconds', 'API request latency', ['method', 'route', 'status'], buckets=LATENCY_BUCKETS)
+# multiprocess_mode only applies under a multi-worker server (PROMETHEUS_MULTIPROC_DIR)
+HTTP_IN_FLIGHT = Gauge('tripsy_http_requests_in_flight', 'API requests being served', multiprocess_mode='livesum')
+HTTP_IN_FLIGHT_OBSERVED = Histogram(
+    'tripsy_http_requests_in_flight_observed', 'Requests already in flight when a request arrives',
+    buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+LLM_CALLS = Counter('tripsy_llm_calls_total', 'LLM calls', ['model', 'node'])
+RATE_LIMIT_WAIT = Histogram(
+    'tripsy_serpapi_rate_limit_wait_seconds', 'Time SerpAPI calls queued for a quota token',
+    ['priority', 'outcome'], buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30))
+SERPAPI_HEDGES = Counter('tripsy_serpapi_hedges_total', 'Hedged SerpAPI requests', ['engine', 'outcome'])
+SERPAPI_FALLBACKS = Counter(
+    'tripsy_serpapi_fallbacks_total', 'SerpAPI failures answered from the cache or failed fast', ['engine', 'outcome'])
+BREAKER_STATE = Gauge('tripsy_serpapi_circuit_state', 'SerpAPI circuit per engine (0 closed, 1 half open, 2 open)',
+                      ['engine'], multiprocess_mode='livemax')
+LLM_COST = Counter('tripsy_llm_cost_usd_total', 'Estimated LLM spend in USD', ['model', 'node'])
+AGENT_RUN_REQUESTS = Histogram(
+    'tripsy_agent_run_llm_requests', 'LLM requests per Agent run', buckets=(1, 2, 3, 4, 6, 8, 10, 15, 20, 30))
+AGENT_RUN_TOKENS = Histogram('tripsy_agent_run_tokens', 'Tokens per Agent run', buckets=TOKEN_BUCKETS + (131072, 262144))
+AGENT_RUN_TOOL_CALLS = Histogram(
+    'tripsy_agent_run_tool_calls', 'Tool calls per Agent run', buckets=(0, 1, 2, 4, 6, 8, 12, 16, 24, 32))
+AGENT_RUN_SECONDS = Histogram('tripsy_agent_run_seconds', 'Time spent in Agent graph nodes per run',
+                              buckets=LATENCY_BUCKETS + (120, 300))
+AGENT_RUN_COST = Histogram('tripsy_agent_run_cost_usd', 'Estimated LLM spend per Agent run',
+                           buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+AGENT_RUNS = Counter('tripsy_agent_runs_total', 'Finished Agent runs', ['outcome'])
+LLM_CACHE_HITS = Counter('tripsy_llm_cache_hits_total', 'LLM replies served from the response cache', ['model', 'node'])
+
+_in_flight = 0
+
+
+@contextmanager
+def upstream_call(upstream: str, operation: str, **attributes):
+    '''Span plus latency observation for one call to an external service.'''
+    start = time.perf_counter()
+    outcome = 'ok'
+    with logfire.span('{upstream} {operation}', upstream=upstream, operation=operation, **attributes):
+        try:
+            yield
+        except BaseException:
+            outcome = 'error'
+            raise
+        finally:
+            UPSTREAM_LATENCY.labels(upstream, operation, outcome).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def in_flight_request():
+    '''Count a request as in flight; called from the event loop only, so no lock.'''
+    global _in_flight
+    HTTP_IN_FLIGHT_OBSERVED.observe(_in_flight)
+    _in_flight += 1
+    HTTP_IN_FLIGHT.inc()
+    try:
+        yield
+    finally:
+        _in_flight -= 1
+        HTTP_IN_FLIGHT.dec()
+
+
+@contextmanager
+def tool_call(tool: str):
+    start = time.perf_counter()
+    outcome = 'ok'
+    with logfire.span('tool {tool}', tool=tool):
+        try:
+            yield
+        except BaseException:
+            outcome = 'error'
+            raise
+        finally:
+            TOOL_LATENCY.labels(tool, outcome).observe(time.perf_counter() - start)
+
+
+def record_llm_usage(model: str, node: str, message) -> Optional[dict]:
+    '''
+    Token histograms from a chat model reply; returns its usage metadata, or
+    None for a reply replayed from the LLM cache, which cost no tokens.
+    '''
+    if getattr(message, 'response_metadata', {}).get('cache_hit'):
+        LLM_CACHE_HITS.labels(model, node).inc()
+        return None
+    LLM_CALLS.labels(model, node).inc()
+    usage = getattr(message, 'usage_metadata', None)
+    if usage:
+        LLM_TOKENS.labels(model, 'prompt').observe(usage.get('input_tokens', 0))
+        LLM_TOKENS.labels(model, 'completion').observe(usage.get('output_tokens', 0))
+        LLM_COST.labels(model, node).inc(cost_usd(model, usage.get('input_tokens', 0), usage.get('output_tokens', 0)))
+    return usage
+
+
+def record_run_usage(usage: dict, outcome: str):
+    '''Totals of one finished Agent run; `outcome` is 'completed' or the limit that stopped it.'''
+    AGENT_RUNS.labels(outcome).inc()
+    AGENT_RUN_REQUESTS.observe(usage.get('requests', 0))
+    AGENT_RUN_TOKENS.observe(usage.get('total_tokens', 0))
+    AGENT_RUN_TOOL_CALLS.observe(usage.get('tool_calls', 0))
+    AGENT_RUN_SECONDS.observe(usage.get('seconds', 0))
+    AGENT_RUN_COST.observe(usage.get('cost_usd', 0))
+
+
+class CacheCollector:
+    '''Exports a cache's counters and hit ratio at scrape time.'''
+
+    def __init__(self, prefix: str, title: str, get_cache):
+        self.prefix = prefix
+        self.title = title
+        self.get_cache = get_cache
+
+    def collect(self):
+        cache = self.get_cache()
+        if cache is None:
+            return
+        stats = dict(cache.stats)
+        requests = CounterMetricFamily(f'{self.prefix}_requests', f'{self.title} lookups', labels=['result'])
+        requests.add_metric(['hit'], stats.get('hits', 0))
+        requests.add_metric(['miss'], stats.get('misses', 0))
+        yield requests
+        for name in ('stores', 'evictions', 'disk_hits', 'stale_hits'):
+            if name not in stats:
+                continue
+            yield CounterMetricFamily(f'{self.prefix}_{name}', f'{self.title} {name.replace("_", " ")}',
+                                      value=stats.get(name, 0))
+        lookups = stats.get('hits', 0) + stats.get('misses', 0)
+        yield GaugeMetricFamily(f'{self.prefix}_hit_ratio', f'Share of {self.title} lookups that hit',
+                                value=stats.get('hits', 0) / lookups if lookups else 0.0)
+
+
+REGISTRY.register(CacheCollector('tripsy_serpapi_cache', 'SerpAPI cache', get_cache))
+REGISTRY.register(CacheCollector('tripsy_llm_cache', 'LLM response cache', get_response_store))
+
+
+def metrics_registry():
+    '''
+    Registry /metrics exports. With PROMETHEUS_MULTIPROC_DIR set (the
+    multi-worker server) it merges every worker's metric files; the cache
+    collectors are left out there, as they only know the answering worker's
+    counters (/api/stats still has them, per worker).
+    '''
+    if not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
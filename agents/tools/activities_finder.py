@@ -1,8 +1,10 @@
 import os
 from typing import Optional
 from langchain.pydantic_v1 import BaseModel, Field
-from langchain_core.tools import tool
-import serpapi
+from langchain_core.tools import StructuredTool
+
+from agents.tools import serpapi_client
+from agents.tools.records import compact_places
 
 class ActivitiesInput(BaseModel):
     location: str = Field(description='Location to find activities')
@@ -13,22 +15,41 @@ class ActivitiesInput(BaseModel):
 class ActivitiesInputSchema(BaseModel):
     params: ActivitiesInput
 
-@tool(args_schema=ActivitiesInputSchema)
-def activities_finder(params: ActivitiesInput):
-    '''
-    Find activities and attractions using Google Places API.
-    '''
-    params = {
+def _search_params(params: ActivitiesInput) -> dict:
+    return {
         'api_key': os.environ.get('SERPAPI_API_KEY'),
         'engine': 'google_maps',
         'type': 'things to do',
         'q': f'attractions in {params.location}',
         'hl': 'en'
     }
-    
+
+
+def _activities_finder(params: ActivitiesInput):
+    '''
+    Find activities and attractions using Google Places API.
+    '''
     try:
-        search = serpapi.search(params)
-        results = search.data.get('local_results', [])[:5]
-        return results
+        results = serpapi_client.search(_search_params(params), project=compact_places)
+        return results.get('local_results', [])[:5]
     except Exception as e:
-        return str(e) 
\ No newline at end of file
+        return str(e)
+
+
+async def aactivities_finder(params: ActivitiesInput):
+    '''
+    Awaitable variant of `activities_finder` that goes through the shared async transport.
+    '''
+    try:
+        results = await serpapi_client.asearch(_search_params(params), project=compact_places)
+        return results.get('local_results', [])[:5]
+    except Exception as e:
+        return str(e)
+
+
+activities_finder = StructuredTool.from_function(
+    func=_activities_finder,
+    coroutine=aactivities_finder,
+    name='activities_finder',
+    args_schema=ActivitiesInputSchema,
+)
@@ -1,19 +1,22 @@
 import os
 from typing import Optional
-from pydantic import BaseModel
-from langchain.pydantic_v1 import Field
-from langchain_core.tools import tool
-from serpapi import GoogleSearch
+from pydantic import BaseModel, Field
+from langchain_core.tools import StructuredTool
 from dotenv import load_dotenv
 
+from agents.tools import serpapi_client
+from agents.tools.records import compact_flights
+from agents.tools.search_cache import get_cache
+
 load_dotenv()
 
 
 class FlightsInput(BaseModel):
-    departure_airport: Optional[str] = Field(description='Departure airport code (IATA)')
-    arrival_airport: Optional[str] = Field(description='Arrival airport code (IATA)')
-    outbound_date: Optional[str] = Field(description='Parameter defines the outbound date. The format is YYYY-MM-DD.')
-    return_date: Optional[str] = Field(description='Parameter defines the return date. The format is YYYY-MM-DD.')
+    departure_airport: str = Field(description='Departure airport code (IATA)')
+    arrival_airport: str = Field(description='Arrival airport code (IATA)')
+    outbound_date: str = Field(description='Parameter defines the outbound date. The format is YYYY-MM-DD.')
+    return_date: Optional[str] = Field(
+        default=None, description='Parameter defines the return date. The format is YYYY-MM-DD. Omit for one way.')
     adults: Optional[int] = Field(default=1, description='Parameter defines the number of adults.')
     children: Optional[int] = Field(default=0, description='Parameter defines the number of children.')
     infants_in_seat: Optional[int] = Field(default=0, description='Parameter defines the number of infants in seat.')
@@ -24,45 +27,82 @@ class FlightsInputSchema(BaseModel):
     params: FlightsInput
 
 
-@tool(args_schema=FlightsInputSchema)
-def flights_finder(params: FlightsInput):
-    '''
-    Find flights using the Google Flights engine.
-
-    Returns:
-        dict: Flight search results.
-    '''
-
-    search_params = {
+def _search_params(params: FlightsInput) -> dict:
+    return {
         'api_key': os.getenv('SERP_API_KEY'),
         'engine': 'google_flights',
         'departure_id': params.departure_airport,
         'arrival_id': params.arrival_airport,
         'outbound_date': params.outbound_date,
         'return_date': params.return_date,
+        # 1 is round trip, 2 one way
+        'type': 1 if params.return_date else 2,
         'currency': 'USD',
         'hl': 'en',
         'adults': params.adults,
         'children': params.children
     }
 
+
+def _parse_results(results: dict, params: FlightsInput):
+    if 'error' in results:
+        print(f"SerpAPI Error: {results['error']}")
+        return []
+
+    flights = results.get('best_flights', [])
+    # Add direct booking links if available from SerpAPI response
+    for flight in flights:
+        if 'booking_link' not in flight:
+            # Construct a Google Flights search URL as fallback
+            flight['booking_link'] = (
+                f"https://www.google.com/travel/flights?q=Flights%20"
+                f"from%20{params.departure_airport}%20to%20{params.arrival_airport}"
+            )
+    return flights
+
+
+def _flights_finder(params: FlightsInput):
+    '''
+    Find flights using the Google Flights engine.
+
+    Returns:
+        dict: Flight search results.
+    '''
+    try:
+        results = serpapi_client.search(_search_params(params), project=compact_flights)
+        return _parse_results(results, params)
+    except Exception as e:
+        print(f"Exception in flights_finder: {str(e)}")
+        return str(e)
+
+
+async def aflights_finder(params: FlightsInput):
+    '''
+    Awaitable variant of `flights_finder` that goes through the shared async transport.
+    '''
     try:
-        search = GoogleSearch(search_params)
-        results = search.get_dict()
-        if 'error' in results:
-            print(f"SerpAPI Error: {results['error']}")
-            return []
-            
-        flights = results.get('best_flights', [])
-        # Add direct booking links if available from SerpAPI response
-        for flight in flights:
-            if 'booking_link' not in flight:
-                # Construct a Google Flights search URL as fallback
-                flight['booking_link'] = (
-                    f"https://www.google.com/travel/flights?q=Flights%20"
-                    f"from%20{params.departure_airport}%20to%20{params.arrival_airport}"
-                )
-        return flights
+        results = await serpapi_client.asearch(_search_params(params), project=compact_flights)
+        return _parse_results(results, params)
     except Exception as e:
         print(f"Exception in flights_finder: {str(e)}")
         return str(e)
+
+
+async def acached_flights(params: FlightsInput):
+    '''
+    Parsed results for `params` if the search cache already holds them, otherwise None.
+    Never goes upstream.
+    '''
+    cache = get_cache()
+    if cache is None:
+        return None
+    results = await cache.aget(_search_params(params))
+    return None if results is None else _parse_results(results, params)
+
+
+flights_finder = StructuredTool.from_function(
+    func=_flights_finder,
+    coroutine=aflights_finder,
+    name='flights_finder',
+    args_schema=FlightsInputSchema,
+)
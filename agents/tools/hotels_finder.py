@@ -1,9 +1,11 @@
 import os
 from typing import Optional
 
-import serpapi
 from langchain.pydantic_v1 import BaseModel, Field
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
+
+from agents.tools import serpapi_client
+from agents.tools.records import compact_hotels
 
 # from pydantic import BaseModel, Field
 
@@ -24,16 +26,8 @@ class HotelsInputSchema(BaseModel):
     params: HotelsInput
 
 
-@tool(args_schema=HotelsInputSchema)
-def hotels_finder(params: HotelsInput):
-    '''
-    Find hotels using the Google Hotels engine.
-
-    Returns:
-        dict: Hotel search results.
-    '''
-
-    params = {
+def _search_params(params: HotelsInput) -> dict:
+    return {
         'api_key': os.environ.get('SERPAPI_API_KEY'),
         'engine': 'google_hotels',
         'hl': 'en',
@@ -49,6 +43,44 @@ def hotels_finder(params: HotelsInput):
         'hotel_class': params.hotel_class
     }
 
-    search = serpapi.search(params)
-    results = search.data
-    return results['properties'][:5]
+
+def _parse_results(results: dict):
+    if 'error' in results:
+        print(f"SerpAPI Error: {results['error']}")
+        return []
+    return results.get('properties', [])[:5]
+
+
+def _hotels_finder(params: HotelsInput):
+    '''
+    Find hotels using the Google Hotels engine.
+
+    Returns:
+        dict: Hotel search results.
+    '''
+    try:
+        results = serpapi_client.search(_search_params(params), project=compact_hotels)
+        return _parse_results(results)
+    except Exception as e:
+        print(f"Exception in hotels_finder: {str(e)}")
+        return str(e)
+
+
+async def ahotels_finder(params: HotelsInput):
+    '''
+    Awaitable variant of `hotels_finder` that goes through the shared async transport.
+    '''
+    try:
+        results = await serpapi_client.asearch(_search_params(params), project=compact_hotels)
+        return _parse_results(results)
+    except Exception as e:
+        print(f"Exception in hotels_finder: {str(e)}")
+        return str(e)
+
+
+hotels_finder = StructuredTool.from_function(
+    func=_hotels_finder,
+    coroutine=ahotels_finder,
+    name='hotels_finder',
+    args_schema=HotelsInputSchema,
+)
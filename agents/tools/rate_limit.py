@@ -0,0 +1,236 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from agents.telemetry import RATE_LIMIT_WAIT
+
+load_dotenv()
+
+# Sustained SerpAPI requests per second per API key across every process
+# sharing SERPAPI_RATE_LIMIT_PATH, and how many may go out back to back.
+# SERPAPI_RATE=0 turns the limiter off.
+SERPAPI_RATE = float(os.getenv('SERPAPI_RATE', '5'))
+SERPAPI_BURST = float(os.getenv('SERPAPI_BURST', '10'))
+# Unset or empty keeps the bucket in this process only; the multi-worker
+# server (api/server.py) points it at a shared file.
+SERPAPI_RATE_LIMIT_PATH = os.getenv('SERPAPI_RATE_LIMIT_PATH', '')
+# Longest a request queues for a token before it fails like an upstream 429.
+SERPAPI_RATE_LIMIT_TIMEOUT = float(os.getenv('SERPAPI_RATE_LIMIT_TIMEOUT', '30'))
+# How long SerpAPI 429s pause every process sharing the bucket.
+SERPAPI_429_PAUSE = float(os.getenv('SERPAPI_429_PAUSE', '2'))
+
+# Lower goes first. Waiters are served strictly by class, then in arrival order.
+PRIORITIES = {'interactive': 0, 'agent': 1, 'batch': 2, 'background': 3}
+DEFAULT_PRIORITY = 'interactive'
+
+# A waiter that stops polling (its process died) no longer holds others back after this.
+WAITER_LEASE = 2.0
+MAX_POLL = 0.25
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    blocked_until REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS waiters (
+    id TEXT PRIMARY KEY,
+    bucket TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    enqueued_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS waiters_bucket ON waiters (bucket, priority, enqueued_at);
+'''
+
+_priority: ContextVar[str] = ContextVar('serpapi_priority', default=DEFAULT_PRIORITY)
+
+
+@contextmanager
+def request_priority(priority: str):
+    '''SerpAPI calls made inside the block, including tasks it starts, queue in this class.'''
+    if priority not in PRIORITIES:
+        raise ValueError(f'Unknown priority {priority!r}, expected one of {", ".join(PRIORITIES)}')
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def bucket_name(api_key: Optional[str]) -> str:
+    '''Quota is per API key; the key itself never reaches the shared file.'''
+    return 'serpapi:' + hashlib.sha256((api_key or '').encode()).hexdigest()[:16]
+
+
+class RateLimitTimeout(Exception):
+    '''No token became available within the timeout.'''
+
+
+class TokenBucketLimiter:
+    '''
+    Token bucket kept in SQLite, so every worker, the agent tools and batch
+    jobs that point at the same file draw from one budget.
+
+    Each acquire refills the bucket from the elapsed time inside one
+    BEGIN IMMEDIATE transaction. Callers that cannot take a token register in
+    `waiters` and poll; a token only goes to the caller with no live waiter
+    ahead of it, so interactive requests overtake queued background ones in
+    every process.
+    '''
+
+    def __init__(self, rate: float = SERPAPI_RATE, burst: float = SERPAPI_BURST,
+                 path: Optional[str] = SERPAPI_RATE_LIMIT_PATH, timeout: float = SERPAPI_RATE_LIMIT_TIMEOUT):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.timeout = timeout
+        self.shared = bool(path)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path or ':memory:', timeout=10, check_same_thread=False, isolation_level=None)
+        if self.shared:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+
+    def _try_acquire(self, bucket: str, waiter: str, priority: int, enqueued_at: float) -> float:
+        '''Take a token (returns 0) or queue and return how long to sleep before trying again.'''
+        with self._lock:
+            now = time.time()
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._db.execute('SELECT tokens, updated_at, blocked_until FROM buckets WHERE name = ?',
+                                       (bucket,)).fetchone()
+                tokens, updated_at, blocked_until = row if row is not None else (self.burst, now, 0.0)
+                # Nothing refills while paused after a 429
+                tokens = min(self.burst, tokens + max(0.0, now - max(updated_at, blocked_until)) * self.rate)
+                ahead = self._db.execute(
+                    'SELECT COUNT(*) FROM waiters WHERE bucket = ? AND id != ? AND expires_at > ? '
+                    'AND (priority < ? OR (priority = ? AND enqueued_at < ?))',
+                    (bucket, waiter, now, priority, priority, enqueued_at),
+                ).fetchone()[0]
+                granted = ahead == 0 and tokens >= 1 and now >= blocked_until
+                if granted:
+                    tokens -= 1
+                    self._db.execute('DELETE FROM waiters WHERE id = ?', (waiter,))
+                else:
+                    self._db.execute('INSERT OR REPLACE INTO waiters VALUES (?, ?, ?, ?, ?)',
+                                     (waiter, bucket, priority, enqueued_at, now + WAITER_LEASE))
+                self._db.execute('INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?)',
+                                 (bucket, tokens, now, blocked_until))
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+        if granted:
+            return 0.0
+        wait = max(blocked_until - now, (ahead + 1 - tokens) / self.rate)
+        return min(max(wait, 0.005), MAX_POLL)
+
+    def _leave(self, waiter: str):
+        with self._lock:
+            self._db.execute('DELETE FROM waiters WHERE id = ?', (waiter,))
+
+    def acquire(self, api_key: Optional[str] = None, priority: Optional[str] = None) -> float:
+        '''Block until a token is taken; returns the seconds spent queued.'''
+        if self.rate <= 0:
+            return 0.0
+        priority = priority or current_priority()
+        bucket, waiter, start = bucket_name(api_key), uuid.uuid4().hex, time.time()
+        try:
+            while True:
+                wait = self._try_acquire(bucket, waiter, PRIORITIES[priority], start)
+                waited = time.time() - start
+                if wait == 0:
+                    RATE_LIMIT_WAIT.labels(priority, 'granted').observe(waited)
+                    return waited
+                if waited + wait > self.timeout:
+                    RATE_LIMIT_WAIT.labels(priority, 'timeout').observe(waited)
+                    raise RateLimitTimeout(f'No SerpAPI quota token within {self.timeout:g}s')
+                time.sleep(wait)
+        except BaseException:
+            self._leave(waiter)
+            raise
+
+    async def aacquire(self, api_key: Optional[str] = None, priority: Optional[str] = None) -> float:
+        if self.rate <= 0:
+            return 0.0
+        priority = priority or current_priority()
+        bucket, waiter, start = bucket_name(api_key), uuid.uuid4().hex, time.time()
+        try:
+            while True:
+                if self.shared:
+                    wait = await asyncio.to_thread(self._try_acquire, bucket, waiter, PRIORITIES[priority], start)
+                else:
+                    wait = self._try_acquire(bucket, waiter, PRIORITIES[priority], start)
+                waited = time.time() - start
+                if wait == 0:
+                    RATE_LIMIT_WAIT.labels(priority, 'granted').observe(waited)
+                    return waited
+                if waited + wait > self.timeout:
+                    RATE_LIMIT_WAIT.labels(priority, 'timeout').observe(waited)
+                    raise RateLimitTimeout(f'No SerpAPI quota token within {self.timeout:g}s')
+                await asyncio.sleep(wait)
+        except BaseException:
+            self._leave(waiter)
+            raise
+
+    def pause(self, api_key: Optional[str] = None, seconds: float = SERPAPI_429_PAUSE):
+        '''Upstream said 429: hold every process off this key for `seconds` and empty the bucket.'''
+        if self.rate <= 0:
+            return
+        bucket, now = bucket_name(api_key), time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO buckets VALUES (?, 0, ?, ?) ON CONFLICT(name) DO UPDATE SET '
+                'tokens = 0, updated_at = excluded.updated_at, '
+                'blocked_until = MAX(blocked_until, excluded.blocked_until)',
+                (bucket, now, now + seconds),
+            )
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            buckets = self._db.execute('SELECT name, tokens, updated_at, blocked_until FROM buckets').fetchall()
+            waiting = self._db.execute('SELECT priority, COUNT(*) FROM waiters WHERE expires_at > ? GROUP BY priority',
+                                       (now,)).fetchall()
+        names = {v: k for k, v in PRIORITIES.items()}
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'shared': self.shared,
+            'buckets': {name: {'tokens': round(min(self.burst, tokens + max(0.0, now - max(updated_at, blocked_until))
+                                                       * self.rate), 2),
+                               'paused_for': round(max(0.0, blocked_until - now), 2)}
+                        for name, tokens, updated_at, blocked_until in buckets},
+            'waiting': {names.get(p, str(p)): n for p, n in waiting},
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_limiter: Optional[TokenBucketLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> TokenBucketLimiter:
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = TokenBucketLimiter()
+        return _limiter
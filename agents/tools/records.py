@@ -0,0 +1,171 @@
+from dataclasses import dataclass, fields
+from typing import Optional
+
+# Compact, slotted views of the SerpAPI payloads. Only the fields the agents,
+# the API and the email renderer actually read survive normalization; the rest
+# of each raw result (carbon data, price histories, nearby places, review
+# breakdowns, tokens, ...) is dropped before anything is cached or returned.
+
+
+@dataclass(slots=True)
+class FlightLeg:
+    departure_airport: Optional[str] = None
+    departure_name: Optional[str] = None
+    departure_time: Optional[str] = None
+    arrival_airport: Optional[str] = None
+    arrival_name: Optional[str] = None
+    arrival_time: Optional[str] = None
+    duration: Optional[int] = None
+    airline: Optional[str] = None
+    flight_number: Optional[str] = None
+    airplane: Optional[str] = None
+    travel_class: Optional[str] = None
+
+
+@dataclass(slots=True)
+class FlightOption:
+    price: Optional[float] = None
+    total_duration: Optional[int] = None
+    stops: int = 0
+    carrier: Optional[str] = None
+    carrier_logo: Optional[str] = None
+    trip_type: Optional[str] = None
+    legs: tuple = ()
+    booking_link: Optional[str] = None
+
+
+@dataclass(slots=True)
+class HotelOption:
+    name: Optional[str] = None
+    price_per_night: Optional[float] = None
+    total_price: Optional[float] = None
+    rating: Optional[float] = None
+    reviews: Optional[int] = None
+    hotel_class: Optional[int] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    description: Optional[str] = None
+    amenities: tuple = ()
+    thumbnail: Optional[str] = None
+    link: Optional[str] = None
+
+
+@dataclass(slots=True)
+class PlaceOption:
+    name: Optional[str] = None
+    category: Optional[str] = None
+    rating: Optional[float] = None
+    reviews: Optional[int] = None
+    price: Optional[str] = None
+    address: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    thumbnail: Optional[str] = None
+    link: Optional[str] = None
+
+
+MAX_AMENITIES = 10
+
+
+def as_dict(record) -> dict:
+    '''Plain dict of a record (nested records and tuples included), without unset fields.'''
+    result = {}
+    for f in fields(record):
+        value = getattr(record, f.name)
+        if value is None or value == ():
+            continue
+        if isinstance(value, tuple):
+            value = [as_dict(v) if hasattr(v, '__slots__') else v for v in value]
+        result[f.name] = value
+    return result
+
+
+def _airport(leg: dict, key: str) -> dict:
+    airport = leg.get(key)
+    return airport if isinstance(airport, dict) else {}
+
+
+def normalize_flight(raw: dict) -> FlightOption:
+    legs = []
+    for leg in raw.get('flights') or ():
+        departure = _airport(leg, 'departure_airport')
+        arrival = _airport(leg, 'arrival_airport')
+        legs.append(FlightLeg(
+            departure_airport=departure.get('id'),
+            departure_name=departure.get('name'),
+            departure_time=departure.get('time'),
+            arrival_airport=arrival.get('id'),
+            arrival_name=arrival.get('name'),
+            arrival_time=arrival.get('time'),
+            duration=leg.get('duration'),
+            airline=leg.get('airline'),
+            flight_number=leg.get('flight_number'),
+            airplane=leg.get('airplane'),
+            travel_class=leg.get('travel_class'),
+        ))
+    carriers = list(dict.fromkeys(leg.airline for leg in legs if leg.airline))
+    return FlightOption(
+        price=raw.get('price'),
+        total_duration=raw.get('total_duration'),
+        stops=max(len(legs) - 1, 0),
+        carrier=', '.join(carriers) or None,
+        carrier_logo=raw.get('airline_logo') or next(
+            (leg.get('airline_logo') for leg in raw.get('flights') or () if leg.get('airline_logo')), None),
+        trip_type=raw.get('type'),
+        legs=tuple(legs),
+        booking_link=raw.get('booking_link'),
+    )
+
+
+def normalize_hotel(raw: dict) -> HotelOption:
+    coordinates = raw.get('gps_coordinates') or {}
+    images = raw.get('images') or [{}]
+    return HotelOption(
+        name=raw.get('name'),
+        price_per_night=(raw.get('rate_per_night') or {}).get('extracted_lowest'),
+        total_price=(raw.get('total_rate') or {}).get('extracted_lowest'),
+        rating=raw.get('overall_rating'),
+        reviews=raw.get('reviews'),
+        hotel_class=raw.get('extracted_hotel_class'),
+        latitude=coordinates.get('latitude'),
+        longitude=coordinates.get('longitude'),
+        description=raw.get('description'),
+        amenities=tuple((raw.get('amenities') or ())[:MAX_AMENITIES]),
+        thumbnail=images[0].get('thumbnail'),
+        link=raw.get('link'),
+    )
+
+
+def normalize_place(raw: dict) -> PlaceOption:
+    coordinates = raw.get('gps_coordinates') or {}
+    return PlaceOption(
+        name=raw.get('title'),
+        category=raw.get('type'),
+        rating=raw.get('rating'),
+        reviews=raw.get('reviews'),
+        price=raw.get('price'),
+        address=raw.get('address'),
+        latitude=coordinates.get('latitude'),
+        longitude=coordinates.get('longitude'),
+        thumbnail=raw.get('thumbnail'),
+        link=raw.get('website'),
+    )
+
+
+def _compact(results: dict, key: str, normalize) -> dict:
+    # Error payloads pass through untouched so callers can still report them.
+    if 'error' in results:
+        return {'error': results['error']}
+    return {key: [as_dict(normalize(item)) for item in results.get(key) or ()]}
+
+
+def compact_flights(results: dict) -> dict:
+    return _compact(results, 'best_flights', normalize_flight)
+
+
+def compact_hotels(results: dict) -> dict:
+    return _compact(results, 'properties', normalize_hotel)
+
+
+def compact_places(results: dict) -> dict:
+    return _compact(results, 'local_results', normalize_place)
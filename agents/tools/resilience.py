@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from agents.telemetry import BREAKER_STATE
+
+load_dotenv()
+
+# Hedging: when a search has not answered after the recent p95 latency of its
+# engine (clamped to the min/max delay), a second identical request is sent
+# and the first success wins. The ratio caps the extra quota hedges may spend.
+SERPAPI_HEDGE = os.getenv('SERPAPI_HEDGE', '1') not in ('0', 'false', 'False')
+SERPAPI_HEDGE_QUANTILE = float(os.getenv('SERPAPI_HEDGE_QUANTILE', '0.95'))
+SERPAPI_HEDGE_MIN_DELAY = float(os.getenv('SERPAPI_HEDGE_MIN_DELAY', '0.25'))
+SERPAPI_HEDGE_MAX_DELAY = float(os.getenv('SERPAPI_HEDGE_MAX_DELAY', '8'))
+# Delay used until an engine has SERPAPI_HEDGE_MIN_SAMPLES latencies on record.
+SERPAPI_HEDGE_DEFAULT_DELAY = float(os.getenv('SERPAPI_HEDGE_DEFAULT_DELAY', '3'))
+SERPAPI_HEDGE_MIN_SAMPLES = int(os.getenv('SERPAPI_HEDGE_MIN_SAMPLES', '20'))
+SERPAPI_HEDGE_MAX_RATIO = float(os.getenv('SERPAPI_HEDGE_MAX_RATIO', '0.1'))
+SERPAPI_HEDGE_WINDOW = int(os.getenv('SERPAPI_HEDGE_WINDOW', '200'))
+
+# Circuit breaker: this many upstream failures in a row open the circuit for
+# an engine; after the cooldown one probe request decides whether it closes.
+SERPAPI_BREAKER_FAILURES = int(os.getenv('SERPAPI_BREAKER_FAILURES', '5'))
+SERPAPI_BREAKER_COOLDOWN = float(os.getenv('SERPAPI_BREAKER_COOLDOWN', '30'))
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class HedgePolicy:
+    '''
+    Per-engine latency window that sets the hedge delay, plus the hedge
+    budget: at most `max_ratio` extra requests per request issued.
+    '''
+
+    def __init__(self, enabled: bool = SERPAPI_HEDGE, quantile: float = SERPAPI_HEDGE_QUANTILE,
+                 min_delay: float = SERPAPI_HEDGE_MIN_DELAY, max_delay: float = SERPAPI_HEDGE_MAX_DELAY,
+                 default_delay: float = SERPAPI_HEDGE_DEFAULT_DELAY, min_samples: int = SERPAPI_HEDGE_MIN_SAMPLES,
+                 max_ratio: float = SERPAPI_HEDGE_MAX_RATIO, window: int = SERPAPI_HEDGE_WINDOW):
+        self.enabled = enabled
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self.window = window
+        self._latencies: dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'hedged': 0, 'hedge_wins': 0}
+
+    def observe(self, engine: str, seconds: float):
+        with self._lock:
+            samples = self._latencies.get(engine)
+            if samples is None:
+                samples = self._latencies[engine] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def delay(self, engine: str) -> Optional[float]:
+        '''Seconds to wait before hedging a request to `engine`, or None to never hedge it.'''
+        if not self.enabled:
+            return None
+        with self._lock:
+            self.stats['requests'] += 1
+            samples = sorted(self._latencies.get(engine, ()))
+        if len(samples) < self.min_samples:
+            return self.default_delay
+        latency = samples[min(len(samples) - 1, int(self.quantile * len(samples)))]
+        return min(max(latency, self.min_delay), self.max_delay)
+
+    def allow(self) -> bool:
+        with self._lock:
+            # One hedge of slack, so a quiet process can still hedge its first slow call
+            if self.stats['hedged'] >= self.max_ratio * self.stats['requests'] + 1:
+                return False
+            self.stats['hedged'] += 1
+            return True
+
+    def won(self):
+        with self._lock:
+            self.stats['hedge_wins'] += 1
+
+
+class CircuitBreaker:
+    '''
+    Closed: requests flow and consecutive failures are counted. Open: requests
+    are refused until the cooldown has passed. Half open: a single probe is let
+    through; its success closes the circuit, its failure opens it again.
+    State is per process; each worker learns upstream health on its own.
+    '''
+
+    def __init__(self, name: str, failures: int = SERPAPI_BREAKER_FAILURES, cooldown: float = SERPAPI_BREAKER_COOLDOWN):
+        self.name = name
+        self.failure_threshold = failures
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.stats = {'opened': 0, 'rejected': 0}
+
+    def _set(self, state: str):
+        if state != self.state:
+            print(f'SerpAPI circuit for {self.name}: {self.state} -> {state}')
+        self.state = state
+        BREAKER_STATE.labels(self.name).set(STATE_VALUES[state])
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    self.stats['rejected'] += 1
+                    return False
+                self._set(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    self.stats['rejected'] += 1
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self._set(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._probing = False
+                self.opened_at = time.monotonic()
+                self.stats['opened'] += self.state != OPEN
+                self._set(OPEN)
+
+    def release(self):
+        '''The request ended without telling anything about upstream health (e.g. it was cancelled).'''
+        with self._lock:
+            self._probing = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = max(0.0, self.cooldown - (time.monotonic() - self.opened_at)) if self.state == OPEN else 0.0
+            return {'state': self.state, 'failures': self.failures, 'retry_in': round(retry_in, 1), **self.stats}
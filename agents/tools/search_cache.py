@@ -0,0 +1,205 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SERPAPI_CACHE_ENABLED = os.getenv('SERPAPI_CACHE_ENABLED', '1') not in ('0', 'false', 'False')
+SERPAPI_CACHE_MAX_ENTRIES = int(os.getenv('SERPAPI_CACHE_MAX_ENTRIES', '1024'))
+SERPAPI_CACHE_PATH = os.getenv('SERPAPI_CACHE_PATH')
+SERPAPI_CACHE_TTL = float(os.getenv('SERPAPI_CACHE_TTL', '600'))
+# Expired payloads are kept this much longer, to be served while SerpAPI is failing.
+SERPAPI_CACHE_STALE_TTL = float(os.getenv('SERPAPI_CACHE_STALE_TTL', '86400'))
+
+# Fares move quickly, hotel rates less so, places hardly at all.
+ENGINE_TTLS = {
+    'google_flights': float(os.getenv('SERPAPI_CACHE_TTL_FLIGHTS', '900')),
+    'google_hotels': float(os.getenv('SERPAPI_CACHE_TTL_HOTELS', '1800')),
+    'google_maps': float(os.getenv('SERPAPI_CACHE_TTL_MAPS', '86400')),
+}
+
+# Parameters that never change the SerpAPI answer.
+IGNORED_PARAMS = ('api_key',)
+
+# Bump when the shape of cached payloads changes so a shared SQLite file
+# written by an older release is not read back with the new parser.
+CACHE_SCHEMA = 2
+
+
+def canonical_params(params: dict) -> dict:
+    '''Drop credentials and unset values, stringify and sort what is left.'''
+    canonical = {}
+    for key, value in params.items():
+        if key in IGNORED_PARAMS or value is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        canonical[key] = str(value)
+    return dict(sorted(canonical.items()))
+
+
+def cache_key(params: dict) -> str:
+    payload = json.dumps([CACHE_SCHEMA, canonical_params(params)], separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SearchCache:
+    '''
+    In-memory LRU of SerpAPI payloads with per-engine TTLs and an optional
+    SQLite write-through store shared by every worker pointing at the same file.
+    Entries outlive their TTL by `stale_ttl`; only `get(..., stale=True)`
+    returns them, for callers that prefer old results to none.
+
+    Payloads are kept as JSON text so every hit hands out a fresh object and
+    callers can annotate results without touching the cached copy.
+    '''
+
+    def __init__(self, max_entries: int = SERPAPI_CACHE_MAX_ENTRIES, path: Optional[str] = SERPAPI_CACHE_PATH,
+                 default_ttl: float = SERPAPI_CACHE_TTL, engine_ttls: Optional[dict] = None,
+                 stale_ttl: float = SERPAPI_CACHE_STALE_TTL):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self.engine_ttls = dict(ENGINE_TTLS if engine_ttls is None else engine_ttls)
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'disk_hits': 0, 'stale_hits': 0}
+        if path:
+            self._open_db(path)
+
+    def _open_db(self, path: str):
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS serpapi_cache ('
+            'key TEXT PRIMARY KEY, engine TEXT, expires_at REAL NOT NULL, payload TEXT NOT NULL)'
+        )
+
+    def ttl_for(self, params: dict) -> float:
+        return self.engine_ttls.get(params.get('engine'), self.default_ttl)
+
+    def _memory_get(self, key: str, now: float, stale: bool = False) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at + self.stale_ttl <= now:
+                del self._entries[key]
+                return None
+            if expires_at <= now and not stale:
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def _memory_put(self, key: str, expires_at: float, payload: str):
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def _disk_get(self, key: str, now: float, stale: bool = False) -> Optional[tuple[float, str]]:
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute(
+                'SELECT expires_at, payload FROM serpapi_cache WHERE key = ? AND expires_at > ?',
+                (key, now - self.stale_ttl if stale else now)
+            ).fetchone()
+        return row
+
+    def _disk_put(self, key: str, engine: Optional[str], expires_at: float, payload: str):
+        if self._db is None:
+            return
+        with self._db_lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO serpapi_cache (key, engine, expires_at, payload) VALUES (?, ?, ?, ?)',
+                (key, engine, expires_at, payload),
+            )
+            self._writes += 1
+            if self._writes % 256 == 0:
+                self._db.execute('DELETE FROM serpapi_cache WHERE expires_at <= ?', (time.time() - self.stale_ttl,))
+
+    def get(self, params: dict, stale: bool = False) -> Optional[dict]:
+        '''
+        Cached payload for `params`. With `stale`, payloads past their TTL are
+        returned too; that is the fallback read and does not count as a lookup.
+        '''
+        key = cache_key(params)
+        now = time.time()
+        payload = self._memory_get(key, now, stale)
+        if payload is None:
+            row = self._disk_get(key, now, stale)
+            if row is not None:
+                expires_at, payload = row
+                self._memory_put(key, expires_at, payload)
+                if not stale:
+                    self.stats['disk_hits'] += 1
+        if stale:
+            self.stats['stale_hits'] += payload is not None
+            return None if payload is None else json.loads(payload)
+        if payload is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return json.loads(payload)
+
+    def set(self, params: dict, results: dict):
+        # SerpAPI reports "no results" and quota problems as 200s with an error key.
+        if not isinstance(results, dict) or 'error' in results:
+            return
+        key = cache_key(params)
+        expires_at = time.time() + self.ttl_for(params)
+        payload = json.dumps(results, separators=(',', ':'))
+        self._memory_put(key, expires_at, payload)
+        self._disk_put(key, params.get('engine'), expires_at, payload)
+        self.stats['stores'] += 1
+
+    async def aget(self, params: dict, stale: bool = False) -> Optional[dict]:
+        if self._db is None:
+            return self.get(params, stale)
+        return await asyncio.to_thread(self.get, params, stale)
+
+    async def aset(self, params: dict, results: dict):
+        if self._db is None:
+            return self.set(params, results)
+        return await asyncio.to_thread(self.set, params, results)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute('DELETE FROM serpapi_cache')
+
+    def close(self):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+
+_cache: Optional[SearchCache] = None
+
+
+def get_cache() -> Optional[SearchCache]:
+    global _cache
+    if not SERPAPI_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = SearchCache()
+    return _cache
@@ -0,0 +1,317 @@
+import asyncio
+import os
+import time
+from typing import Callable, Optional
+from urllib.parse import urljoin
+
+import httpx
+from dotenv import load_dotenv
+
+from agents.telemetry import SERPAPI_FALLBACKS, SERPAPI_HEDGES, upstream_call
+from agents.tools.rate_limit import RateLimitTimeout, TokenBucketLimiter, current_priority, get_rate_limiter
+from agents.tools.resilience import CircuitBreaker, HedgePolicy
+from agents.tools.search_cache import cache_key, get_cache
+from agents.tools.singleflight import SingleFlight
+
+load_dotenv()
+
+SERPAPI_URL = os.getenv('SERPAPI_URL', 'https://serpapi.com/search.json')
+SERPAPI_TIMEOUT = float(os.getenv('SERPAPI_TIMEOUT', '30'))
+SERPAPI_CONNECT_TIMEOUT = float(os.getenv('SERPAPI_CONNECT_TIMEOUT', '5'))
+SERPAPI_MAX_CONNECTIONS = int(os.getenv('SERPAPI_MAX_CONNECTIONS', '256'))
+SERPAPI_MAX_KEEPALIVE = int(os.getenv('SERPAPI_MAX_KEEPALIVE', '64'))
+SERPAPI_KEEPALIVE_EXPIRY = float(os.getenv('SERPAPI_KEEPALIVE_EXPIRY', '60'))
+
+
+def serpapi_key() -> Optional[str]:
+    '''The tools historically read either variable, so accept both.'''
+    return os.getenv('SERP_API_KEY') or os.getenv('SERPAPI_API_KEY')
+
+
+class SerpAPIError(Exception):
+    '''Raised when SerpAPI answers with a non-2xx status or a non-JSON body.'''
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(SerpAPIError):
+    '''Raised without calling SerpAPI while the circuit for the engine is open.'''
+
+
+def is_upstream_failure(e: BaseException) -> bool:
+    '''Errors that say SerpAPI is unhealthy, as opposed to a bad request or a cancelled caller.'''
+    if isinstance(e, httpx.HTTPError):
+        return True
+    if isinstance(e, SerpAPIError) and not isinstance(e, CircuitOpenError):
+        return e.status_code is None or e.status_code >= 500 or e.status_code == 429
+    return False
+
+
+class SerpAPIClient:
+    '''
+    Shared SerpAPI transport backed by pooled keep-alive HTTP clients.
+
+    `search` is the awaitable path used by the API and the agents, `search_sync`
+    serves the synchronous LangChain tool entry points. Both return the decoded
+    JSON payload, including SerpAPI's own `{'error': ...}` payloads on 200s.
+    Every request first takes a token from the shared quota limiter, in the
+    priority class of the calling context (see rate_limit.request_priority).
+    Each engine has a circuit breaker, and slow async searches are hedged with
+    a second request once they pass the engine's recent p95 latency.
+    '''
+
+    def __init__(self, base_url: str = SERPAPI_URL, timeout: float = SERPAPI_TIMEOUT,
+                 max_connections: int = SERPAPI_MAX_CONNECTIONS,
+                 max_keepalive: int = SERPAPI_MAX_KEEPALIVE, limiter: Optional[TokenBucketLimiter] = None,
+                 hedging: Optional[HedgePolicy] = None):
+        self.base_url = base_url
+        self.limiter = limiter if limiter is not None else get_rate_limiter()
+        self.hedging = hedging if hedging is not None else HedgePolicy()
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._timeout = httpx.Timeout(timeout, connect=SERPAPI_CONNECT_TIMEOUT)
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=SERPAPI_KEEPALIVE_EXPIRY,
+        )
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sync_client: Optional[httpx.Client] = None
+
+    @property
+    def aclient(self) -> httpx.AsyncClient:
+        # Pooled connections are bound to the loop that opened them, so a new
+        # loop (e.g. a fresh asyncio.run) gets its own client.
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client.is_closed or self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(timeout=self._timeout, limits=self._limits)
+            self._async_loop = loop
+        return self._async_client
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._sync_client is None or self._sync_client.is_closed:
+            self._sync_client = httpx.Client(timeout=self._timeout, limits=self._limits)
+        return self._sync_client
+
+    @staticmethod
+    def prepare_params(params: dict) -> dict:
+        prepared = {k: v for k, v in params.items() if v is not None}
+        if not prepared.get('api_key'):
+            prepared['api_key'] = serpapi_key()
+        return prepared
+
+    @staticmethod
+    def _decode(response: httpx.Response) -> dict:
+        try:
+            data = response.json()
+        except ValueError:
+            raise SerpAPIError(f'SerpAPI returned a non-JSON response ({response.status_code})',
+                               status_code=response.status_code)
+        if response.status_code >= 400:
+            detail = data.get('error') if isinstance(data, dict) else None
+            raise SerpAPIError(detail or f'SerpAPI request failed ({response.status_code})',
+                               status_code=response.status_code)
+        return data
+
+    def breaker(self, engine: str) -> CircuitBreaker:
+        breaker = self._breakers.get(engine)
+        if breaker is None:
+            breaker = self._breakers.setdefault(engine, CircuitBreaker(engine))
+        return breaker
+
+    def _admit(self, engine: str):
+        if not self.breaker(engine).allow():
+            raise CircuitOpenError(f'SerpAPI {engine} is failing, not retrying before the circuit cooldown',
+                                   status_code=503)
+
+    def _settle(self, engine: str, api_key: Optional[str], error: Optional[BaseException] = None):
+        breaker = self.breaker(engine)
+        if error is None:
+            breaker.record_success()
+        elif is_upstream_failure(error):
+            breaker.record_failure()
+        else:
+            breaker.release()
+        if isinstance(error, SerpAPIError) and error.status_code == 429:
+            self.limiter.pause(api_key)
+
+    async def _attempt(self, engine: str, prepared: dict) -> dict:
+        await self.limiter.aacquire(prepared['api_key'])
+        start = time.perf_counter()
+        try:
+            with upstream_call('serpapi', engine):
+                response = await self.aclient.get(self.base_url, params=prepared)
+                data = self._decode(response)
+        except asyncio.CancelledError:
+            # The other copy of a hedged request won; this one took at least this long
+            self.hedging.observe(engine, time.perf_counter() - start)
+            raise
+        self.hedging.observe(engine, time.perf_counter() - start)
+        return data
+
+    async def _hedged(self, engine: str, prepared: dict) -> dict:
+        delay = self.hedging.delay(engine)
+        first = asyncio.ensure_future(self._attempt(engine, prepared))
+        tasks = {first}
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self.hedging.allow():
+                    SERPAPI_HEDGES.labels(engine, 'sent').inc()
+                    tasks.add(asyncio.ensure_future(self._attempt(engine, prepared)))
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedging.won()
+                            SERPAPI_HEDGES.labels(engine, 'won').inc()
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def search(self, params: dict) -> dict:
+        engine = params.get('engine', 'search')
+        prepared = self.prepare_params(params)
+        self._admit(engine)
+        try:
+            data = await self._hedged(engine, prepared)
+        except RateLimitTimeout as e:
+            self.breaker(engine).release()
+            raise SerpAPIError(str(e), status_code=429)
+        except BaseException as e:
+            self._settle(engine, prepared['api_key'], e)
+            raise
+        self._settle(engine, prepared['api_key'])
+        return data
+
+    def search_sync(self, params: dict) -> dict:
+        # Not hedged: the sync tool path has no event loop to race two requests on
+        engine = params.get('engine', 'search')
+        prepared = self.prepare_params(params)
+        self._admit(engine)
+        try:
+            self.limiter.acquire(prepared['api_key'])
+            start = time.perf_counter()
+            with upstream_call('serpapi', engine):
+                response = self.client.get(self.base_url, params=prepared)
+                data = self._decode(response)
+            self.hedging.observe(engine, time.perf_counter() - start)
+        except RateLimitTimeout as e:
+            self.breaker(engine).release()
+            raise SerpAPIError(str(e), status_code=429)
+        except BaseException as e:
+            self._settle(engine, prepared['api_key'], e)
+            raise
+        self._settle(engine, prepared['api_key'])
+        return data
+
+    def health(self) -> dict:
+        return {'hedging': dict(self.hedging.stats),
+                'circuits': {engine: breaker.snapshot() for engine, breaker in self._breakers.items()}}
+
+    async def warmup(self):
+        '''Open a pooled connection ahead of the first search; account.json is free of quota.'''
+        try:
+            await self.aclient.get(urljoin(self.base_url, '/account.json'), params={'api_key': serpapi_key()})
+        except httpx.HTTPError as e:
+            print(f'SerpAPI warmup failed: {str(e)}')
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_loop = None
+        self.close()
+
+    def close(self):
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
+
+
+_client: Optional[SerpAPIClient] = None
+_upstream = SingleFlight('serpapi')
+
+
+def get_client() -> SerpAPIClient:
+    global _client
+    if _client is None:
+        _client = SerpAPIClient()
+    return _client
+
+
+async def _fetch(params: dict, cache, project) -> dict:
+    results = await get_client().search(params)
+    if project is not None:
+        results = project(results)
+    if cache is not None:
+        await cache.aset(params, results)
+    return results
+
+
+def _stale_or_raise(params: dict, stale: Optional[dict], error: Exception) -> dict:
+    engine = params.get('engine', 'search')
+    if stale is None:
+        SERPAPI_FALLBACKS.labels(engine, 'failed_fast' if isinstance(error, CircuitOpenError) else 'error').inc()
+        raise error
+    SERPAPI_FALLBACKS.labels(engine, 'stale').inc()
+    print(f'Serving stale {engine} results: {str(error)}')
+    return stale
+
+
+async def asearch(params: dict, project: Optional[Callable[[dict], dict]] = None) -> dict:
+    '''
+    Cached, coalesced SerpAPI search. `project` reduces the raw payload before it
+    is cached or shared, so every caller of one engine must pass the same one.
+    While SerpAPI fails (or its circuit is open) an expired cached payload is
+    returned instead of the error when there is one.
+    '''
+    cache = get_cache()
+    if cache is not None:
+        cached = await cache.aget(params)
+        if cached is not None:
+            return cached
+    # Callers only join a fetch queued in their own priority class: one led by
+    # a batch would hold an interactive caller behind the batch's quota wait
+    key = f'{current_priority()}:{cache_key(params)}'
+    try:
+        return await _upstream.do(key, lambda: _fetch(params, cache, project))
+    except Exception as e:
+        if not (is_upstream_failure(e) or isinstance(e, CircuitOpenError)):
+            raise
+        stale = await cache.aget(params, stale=True) if cache is not None else None
+        return _stale_or_raise(params, stale, e)
+
+
+def search(params: dict, project: Optional[Callable[[dict], dict]] = None) -> dict:
+    cache = get_cache()
+    if cache is not None:
+        cached = cache.get(params)
+        if cached is not None:
+            return cached
+    try:
+        results = get_client().search_sync(params)
+    except Exception as e:
+        if not (is_upstream_failure(e) or isinstance(e, CircuitOpenError)):
+            raise
+        return _stale_or_raise(params, cache.get(params, stale=True) if cache is not None else None, e)
+    if project is not None:
+        results = project(results)
+    if cache is not None:
+        cache.set(params, results)
+    return results
+
+
+async def aclose_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,52 @@
+import asyncio
+import copy
+from typing import Any, Awaitable, Callable, Optional
+
+_groups: dict[str, 'SingleFlight'] = {}
+
+
+class SingleFlight:
+    '''
+    Collapses concurrent calls that share a key into one in-flight task.
+
+    The first caller starts the task, everyone who arrives while it is running
+    awaits the same task. The task is shielded, so a caller that gives up (or
+    is cancelled) does not cancel the upstream call for the others. Followers
+    get a deep copy of the result because callers annotate what they receive.
+    '''
+
+    def __init__(self, name: str, share: Optional[Callable[[Any], Any]] = copy.deepcopy):
+        self.name = name
+        self._share = share
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.stats = {'calls': 0, 'executions': 0, 'coalesced': 0, 'in_flight': 0}
+        _groups[name] = self
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.stats['calls'] += 1
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(key)
+        if task is not None and task.get_loop() is loop:
+            self.stats['coalesced'] += 1
+            result = await asyncio.shield(task)
+            return self._share(result) if self._share is not None else result
+
+        task = loop.create_task(fn())
+        self._inflight[key] = task
+        self.stats['executions'] += 1
+        self.stats['in_flight'] += 1
+        task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        self.stats['in_flight'] -= 1
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Nobody may be left awaiting a failed task; read the exception so
+        # asyncio does not log "exception was never retrieved".
+        if not task.cancelled():
+            task.exception()
+
+
+def coalescing_stats() -> dict:
+    return {name: dict(group.stats) for name, group in _groups.items()}
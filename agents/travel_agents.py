@@ -5,60 +5,77 @@ from langchain_openai import ChatOpenAI
 from agents.tools.flights_finder import flights_finder
 from agents.tools.hotels_finder import hotels_finder
 from agents.tools.activities_finder import activities_finder
+from agents.ranking import rank
 
 class BaseTravelAgent:
-    def __init__(self):
-        self.llm = ChatOpenAI(model='gpt-4')
+    def __init__(self, llm: Optional[ChatOpenAI] = None):
+        self.llm = llm if llm is not None else ChatOpenAI(model='gpt-4')
 
 class FlightAgent(BaseTravelAgent):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, llm: Optional[ChatOpenAI] = None):
+        super().__init__(llm)
         self.tool = flights_finder
 
-    async def search(self, departure: str, arrival: str, date: str, budget: float, travelers: int = 1):
+    async def search(self, departure: str, arrival: str, date: str, budget: float, travelers: int = 1,
+                     sort: str = "score", weights: Optional[dict] = None, return_date: Optional[str] = None):
         query = {
-            "departure_airport": departure,
-            "arrival_airport": arrival,
-            "outbound_date": date,
-            "adults": travelers
+            "params": {
+                "departure_airport": departure,
+                "arrival_airport": arrival,
+                "outbound_date": date,
+                "return_date": return_date,
+                "adults": travelers,
+                "children": 0,
+                "infants_in_seat": 0,
+                "infants_on_lap": 0
+            }
         }
-        results = self.tool(query)
-        # Filter by budget
-        return [flight for flight in results if flight.get('price', float('inf')) <= budget]
+        results = await self.tool.ainvoke(query)
+        if isinstance(results, str):  # Error case
+            raise RuntimeError(results)
+        # Filter by budget and rank
+        return rank(results, "flights", weights=weights, sort=sort, budget=budget)
 
 class HotelAgent(BaseTravelAgent):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, llm: Optional[ChatOpenAI] = None):
+        super().__init__(llm)
         self.tool = hotels_finder
 
-    async def search(self, location: str, check_in: str, check_out: str, budget: float, guests: int = 1):
+    async def search(self, location: str, check_in: str, check_out: str, budget: float, guests: int = 1,
+                     sort: str = "score", weights: Optional[dict] = None):
         query = {
-            "q": location,
-            "check_in_date": check_in,
-            "check_out_date": check_out,
-            "adults": guests,
-            "sort_by": "price"
+            "params": {
+                "q": location,
+                "check_in_date": check_in,
+                "check_out_date": check_out,
+                "adults": guests,
+                "sort_by": "price"
+            }
         }
-        results = self.tool(query)
-        # Filter by budget
-        return [hotel for hotel in results if hotel.get('price', float('inf')) <= budget]
+        results = await self.tool.ainvoke(query)
+        if isinstance(results, str):  # Error case
+            raise RuntimeError(results)
+        # Filter by budget and rank
+        return rank(results, "hotels", weights=weights, sort=sort, budget=budget, price_field="total_price")
 
 class ActivityAgent(BaseTravelAgent):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, llm: Optional[ChatOpenAI] = None):
+        super().__init__(llm)
         self.tool = activities_finder
 
     async def search(self, location: str, date: str, budget: Optional[str] = None):
         query = {
-            "location": location,
-            "date": date,
-            "budget": budget
+            "params": {
+                "location": location,
+                "date": date,
+                "budget": budget
+            }
         }
-        return self.tool(query)
+        return await self.tool.ainvoke(query)
 
 class RestaurantAgent(BaseTravelAgent):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, llm: Optional[ChatOpenAI] = None):
+        super().__init__(llm)
 
     async def search(self, location: str, cuisine: Optional[str] = None, budget: Optional[str] = None):
         # Similar to activities_finder but for restaurants
@@ -0,0 +1,85 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Limits for one run of the Agent graph, i.e. from a user message until the
+# model stops calling tools. 0 disables a limit. The request cap matches the
+# UsageLimits(request_limit=15) the pydantic-ai agents in p.py run with.
+AGENT_MAX_LLM_REQUESTS = int(os.getenv('AGENT_MAX_LLM_REQUESTS', '15'))
+AGENT_MAX_TOKENS = int(os.getenv('AGENT_MAX_TOKENS', '200000'))
+AGENT_MAX_TOOL_CALLS = int(os.getenv('AGENT_MAX_TOOL_CALLS', '30'))
+AGENT_MAX_SECONDS = float(os.getenv('AGENT_MAX_SECONDS', '300'))
+AGENT_MAX_COST_USD = float(os.getenv('AGENT_MAX_COST_USD', '0'))
+
+# USD per million (prompt, completion) tokens.
+MODEL_PRICES = {
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4o-mini': (0.15, 0.60),
+}
+
+# How each limit reads in the message that ends a stopped run.
+LIMIT_LABELS = {'requests': 'LLM request', 'tokens': 'token', 'tool_calls': 'tool call', 'seconds': 'time',
+                'cost_usd': 'cost'}
+
+USAGE_FIELDS = ('requests', 'cached_requests', 'prompt_tokens', 'completion_tokens', 'total_tokens', 'tool_calls',
+                'seconds', 'cost_usd')
+
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+def add_usage(left: Optional[dict], right: Optional[dict]) -> dict:
+    '''State reducer: node updates carry deltas that are summed into the thread totals.'''
+    total = dict(left or {})
+    for field, value in (right or {}).items():
+        total[field] = total.get(field, 0) + value
+    return total
+
+
+def usage_since(usage: Optional[dict], start: Optional[dict]) -> dict:
+    usage, start = usage or {}, start or {}
+    return {field: usage.get(field, 0) - start.get(field, 0) for field in USAGE_FIELDS}
+
+
+def llm_usage(model: str, message, seconds: float = 0.0) -> dict:
+    '''Usage delta for one chat model reply; replies replayed from the LLM cache cost nothing.'''
+    if message.response_metadata.get('cache_hit'):
+        return {'cached_requests': 1, 'seconds': seconds}
+    usage = message.usage_metadata or {}
+    prompt_tokens, completion_tokens = usage.get('input_tokens', 0), usage.get('output_tokens', 0)
+    return {'requests': 1, 'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+            'total_tokens': usage.get('total_tokens', prompt_tokens + completion_tokens),
+            'seconds': seconds, 'cost_usd': cost_usd(model, prompt_tokens, completion_tokens)}
+
+
+@dataclass(slots=True)
+class RunLimits:
+    max_requests: int = AGENT_MAX_LLM_REQUESTS
+    max_tokens: int = AGENT_MAX_TOKENS
+    max_tool_calls: int = AGENT_MAX_TOOL_CALLS
+    max_seconds: float = AGENT_MAX_SECONDS
+    max_cost_usd: float = AGENT_MAX_COST_USD
+
+    def exceeded(self, usage: dict, pending_tool_calls: int = 0) -> Optional[str]:
+        '''
+        Name of the first limit the run has reached, or None. `pending_tool_calls`
+        are the calls the model just asked for, so they are refused up front
+        rather than run and then found to be over the limit.
+        '''
+        if self.max_requests and usage.get('requests', 0) >= self.max_requests:
+            return 'requests'
+        if self.max_tokens and usage.get('total_tokens', 0) >= self.max_tokens:
+            return 'tokens'
+        if self.max_tool_calls and usage.get('tool_calls', 0) + pending_tool_calls > self.max_tool_calls:
+            return 'tool_calls'
+        if self.max_seconds and usage.get('seconds', 0) >= self.max_seconds:
+            return 'seconds'
+        if self.max_cost_usd and usage.get('cost_usd', 0) >= self.max_cost_usd:
+            return 'cost_usd'
+        return None
@@ -1,28 +1,188 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+
+import logfire
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from pydantic import BaseModel
 from api.models import (
     FlightSearchRequest, HotelSearchRequest, 
-    ActivitySearchRequest, RestaurantSearchRequest
-)
-from agents.search_agents import (
-    FlightSearchAgent, HotelSearchAgent,
-    ActivitySearchAgent, RestaurantSearchAgent
+    ActivitySearchRequest, RestaurantSearchRequest,
+    TripPlanRequest, AgentStreamRequest,
+    FlightBatchRequest, HotelBatchRequest, FlightCalendarRequest
 )
+from api.registry import AgentRegistry, get_registry
+from api.streaming import agent_events
+from agents.llm_cache import get_response_store
+from agents.tools.rate_limit import get_rate_limiter, request_priority
+from agents.tools.search_cache import get_cache
+from agents.tools.serpapi_client import get_client
+from agents.telemetry import HTTP_LATENCY, in_flight_request, metrics_registry
+from agents.tools.singleflight import SingleFlight, coalescing_stats
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    registry = AgentRegistry()
+    await registry.warmup()
+    app.state.registry = registry
+    yield
+    await registry.aclose()
+
+class TracedJSONResponse(JSONResponse):
+    """JSONResponse whose body encoding shows up as its own span."""
+
+    def render(self, content) -> bytes:
+        with logfire.span("serialize response"):
+            return super().render(content)
+
+app = FastAPI(lifespan=lifespan, default_response_class=TracedJSONResponse)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        with in_flight_request(), logfire.span("{method} {path}", method=request.method, path=request.url.path) as span:
+            response = await call_next(request)
+            status = response.status_code
+            span.set_attribute("status_code", status)
+            return response
+    finally:
+        # The route template keeps the label set bounded; unmatched paths share one label
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_LATENCY.labels(request.method, route, str(status)).observe(time.perf_counter() - start)
+
+flight_searches = SingleFlight("api.flights")
+hotel_searches = SingleFlight("api.hotels")
+activity_searches = SingleFlight("api.activities")
+restaurant_searches = SingleFlight("api.restaurants")
+trip_plans = SingleFlight("api.trips")
+flight_calendars = SingleFlight("api.flights.calendar")
+# Batch items coalesce among themselves only: an interactive search that joined a
+# batch-led call would wait for SerpAPI quota at batch priority
+flight_batches = SingleFlight("api.flights.batch")
+hotel_batches = SingleFlight("api.hotels.batch")
+
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    return value
+
+def request_key(request: BaseModel) -> str:
+    """Identical searches modulo whitespace and letter case share one key."""
+    body = {k: _normalize(v) for k, v in request.model_dump(mode="json").items()}
+    return json.dumps(body, sort_keys=True)
+
+async def _search_flights(request: FlightSearchRequest, registry: AgentRegistry):
+    return await registry.flight_agent.search(
+        departure=request.departure_city,
+        arrival=request.arrival_city,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        budget=request.budget,
+        travelers=request.travelers,
+        sort=request.sort,
+        weights=request.weights,
+        pareto_only=request.pareto_only
+    )
+
+async def _flight_calendar(request: FlightCalendarRequest, registry: AgentRegistry):
+    return await registry.flight_agent.price_calendar(
+        departure=request.departure_city,
+        arrival=request.arrival_city,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        flex_days=request.flex_days,
+        budget=request.budget,
+        travelers=request.travelers,
+        stop_when_within_budget=request.stop_when_within_budget
+    )
+
+async def _search_hotels(request: HotelSearchRequest, registry: AgentRegistry):
+    return await registry.hotel_agent.search(
+        city=request.city,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        budget=request.budget,
+        travelers=request.travelers,
+        rooms=request.room_count,
+        sort=request.sort,
+        weights=request.weights,
+        pareto_only=request.pareto_only
+    )
+
+async def _search_activities(request: ActivitySearchRequest, registry: AgentRegistry):
+    return await registry.activity_agent.search(
+        city=request.city,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        budget=request.budget,
+        activity_type=request.activity_type
+    )
+
+async def _search_restaurants(request: RestaurantSearchRequest, registry: AgentRegistry):
+    return await registry.restaurant_agent.search(
+        city=request.city,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        budget=request.budget,
+        cuisine_type=request.cuisine_type
+    )
+
+async def _plan_trip(request: TripPlanRequest, registry: AgentRegistry):
+    return await registry.coordinator.plan_trip(
+        departure=request.departure_city,
+        destination=request.destination_city,
+        start_date=str(request.start_date),
+        end_date=str(request.end_date),
+        budget=request.budget,
+        travelers=request.travelers,
+        include_activities=request.include_activities,
+        include_restaurants=request.include_restaurants,
+        top_k=request.top_k
+    )
+
+async def _run_batch(items, group: SingleFlight, search, registry: AgentRegistry, concurrency):
+    """
+    Run each distinct item once, at most `concurrency` at a time, and report
+    a result or an error for every position in the original list.
+    """
+    limit = min(concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    semaphore = asyncio.Semaphore(limit)
+    keys = [request_key(item) for item in items]
+    unique = dict(zip(keys, items))
 
-app = FastAPI()
+    async def run(key, item):
+        async with semaphore:
+            try:
+                # Batches queue for SerpAPI quota behind interactive searches
+                with request_priority("batch"):
+                    result = await group.do(key, lambda: search(item, registry))
+            except Exception as e:
+                return {"status": "error", "error": str(e)}
+            if isinstance(result, dict) and "error" in result:
+                return {"status": "error", "error": result["error"]}
+            return {"status": "ok", "result": result}
+
+    outcomes = dict(zip(unique, await asyncio.gather(*(run(k, i) for k, i in unique.items()))))
+    return {
+        "results": [{"index": index, **outcomes[key]} for index, key in enumerate(keys)],
+        "unique_items": len(unique),
+        "concurrency": limit
+    }
 
 @app.post("/api/flights/search")
-async def search_flights(request: FlightSearchRequest):
+async def search_flights(request: FlightSearchRequest, registry: AgentRegistry = Depends(get_registry)):
     try:
-        agent = FlightSearchAgent()
-        results = await agent.search(
-            departure=request.departure_city,
-            arrival=request.arrival_city,
-            start_date=request.start_date,
-            end_date=request.end_date,
-            budget=request.budget,
-            travelers=request.travelers
-        )
-        
+        results = await flight_searches.do(request_key(request), lambda: _search_flights(request, registry))
+
         if "error" in results:
             raise HTTPException(status_code=500, detail=results["error"])
             
@@ -30,48 +190,81 @@ async def search_flights(request: FlightSearchRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/flights/calendar")
+async def flight_calendar(request: FlightCalendarRequest, registry: AgentRegistry = Depends(get_registry)):
+    try:
+        results = await flight_calendars.do(request_key(request), lambda: _flight_calendar(request, registry))
+        return results
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/api/hotels/search")
-async def search_hotels(request: HotelSearchRequest):
+async def search_hotels(request: HotelSearchRequest, registry: AgentRegistry = Depends(get_registry)):
     try:
-        agent = HotelSearchAgent()
-        results = await agent.search(
-            city=request.city,
-            start_date=request.start_date,
-            end_date=request.end_date,
-            budget=request.budget,
-            travelers=request.travelers,
-            rooms=request.room_count
-        )
+        results = await hotel_searches.do(request_key(request), lambda: _search_hotels(request, registry))
         return results
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/activities/search")
-async def search_activities(request: ActivitySearchRequest):
+async def search_activities(request: ActivitySearchRequest, registry: AgentRegistry = Depends(get_registry)):
     try:
-        agent = ActivitySearchAgent()
-        results = await agent.search(
-            city=request.city,
-            start_date=request.start_date,
-            end_date=request.end_date,
-            budget=request.budget,
-            activity_type=request.activity_type
-        )
+        results = await activity_searches.do(request_key(request), lambda: _search_activities(request, registry))
         return results
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/restaurants/search")
-async def search_restaurants(request: RestaurantSearchRequest):
+async def search_restaurants(request: RestaurantSearchRequest, registry: AgentRegistry = Depends(get_registry)):
+    try:
+        results = await restaurant_searches.do(request_key(request), lambda: _search_restaurants(request, registry))
+        return results
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/flights/batch")
+async def batch_search_flights(request: FlightBatchRequest, registry: AgentRegistry = Depends(get_registry)):
+    return await _run_batch(request.items, flight_batches, _search_flights, registry, request.concurrency)
+
+@app.post("/api/hotels/batch")
+async def batch_search_hotels(request: HotelBatchRequest, registry: AgentRegistry = Depends(get_registry)):
+    return await _run_batch(request.items, hotel_batches, _search_hotels, registry, request.concurrency)
+
+@app.post("/api/trips/plan")
+async def plan_trip(request: TripPlanRequest, registry: AgentRegistry = Depends(get_registry)):
     try:
-        agent = RestaurantSearchAgent()
-        results = await agent.search(
-            city=request.city,
-            start_date=request.start_date,
-            end_date=request.end_date,
-            budget=request.budget,
-            cuisine_type=request.cuisine_type
-        )
+        # Legs that fail or time out come back with their status in "legs"
+        # instead of failing the whole plan.
+        results = await trip_plans.do(request_key(request), lambda: _plan_trip(request, registry))
         return results
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/agent/stream")
+async def stream_agent(request: AgentStreamRequest, registry: AgentRegistry = Depends(get_registry)):
+    if not request.message and not request.thread_id:
+        raise HTTPException(status_code=422, detail="message or thread_id is required")
+    return StreamingResponse(
+        agent_events(registry.travel_agent, request.message, request.thread_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/api/stats")
+async def search_stats(registry: AgentRegistry = Depends(get_registry)):
+    cache = get_cache()
+    llm_cache = get_response_store()
+    # Per worker: under the production server each worker has its own counters
+    return {
+        "pid": os.getpid(),
+        "coalescing": coalescing_stats(),
+        "cache": dict(cache.stats) if cache is not None else None,
+        "llm_cache": dict(llm_cache.stats) if llm_cache is not None else None,
+        "email_outbox": await asyncio.to_thread(registry.email_queue.stats),
+        "rate_limit": await asyncio.to_thread(get_rate_limiter().stats),
+        "serpapi": get_client().health()
+    }
@@ -1,6 +1,11 @@
-from pydantic import BaseModel
+import os
+from pydantic import BaseModel, Field, model_validator
 from datetime import date
-from typing import Optional
+from typing import ClassVar, Dict, List, Literal, Optional
+
+from agents.ranking import criteria
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
 
 class TravelSearchRequest(BaseModel):
     start_date: date
@@ -8,11 +13,39 @@ class TravelSearchRequest(BaseModel):
     budget: float
     travelers: Optional[int] = 1
 
-class FlightSearchRequest(TravelSearchRequest):
+Criterion = Literal["price", "duration", "stops", "rating", "distance"]
+
+class RankingOptions(BaseModel):
+    # Result kind being ranked; set by each search request
+    ranking_kind: ClassVar[str]
+
+    sort: Optional[Literal["score", "price", "duration", "stops", "rating", "distance"]] = "score"
+    weights: Optional[Dict[Criterion, float]] = None
+    pareto_only: Optional[bool] = False
+
+    @model_validator(mode="after")
+    def check_sort(self):
+        allowed = criteria(self.ranking_kind)
+        if self.sort not in (None, "score") and self.sort not in allowed:
+            raise ValueError(f"{self.ranking_kind} cannot be sorted by {self.sort}; "
+                             f"use score or one of {', '.join(sorted(allowed))}")
+        return self
+
+class FlightSearchRequest(TravelSearchRequest, RankingOptions):
+    ranking_kind = "flights"
+
+    departure_city: str
+    arrival_city: str
+
+class FlightCalendarRequest(TravelSearchRequest):
     departure_city: str
     arrival_city: str
+    flex_days: Optional[int] = Field(3, ge=0, le=7)
+    stop_when_within_budget: Optional[bool] = True
+
+class HotelSearchRequest(TravelSearchRequest, RankingOptions):
+    ranking_kind = "hotels"
 
-class HotelSearchRequest(TravelSearchRequest):
     city: str
     room_count: Optional[int] = 1
 
@@ -23,4 +56,23 @@ class ActivitySearchRequest(TravelSearchRequest):
 class RestaurantSearchRequest(TravelSearchRequest):
     city: str
     cuisine_type: Optional[str] = None
-    price_level: Optional[str] = None 
\ No newline at end of file
+    price_level: Optional[str] = None
+
+class TripPlanRequest(TravelSearchRequest):
+    departure_city: str
+    destination_city: str
+    include_activities: Optional[bool] = True
+    include_restaurants: Optional[bool] = True
+    top_k: Optional[int] = Field(None, ge=1, le=50)
+
+class AgentStreamRequest(BaseModel):
+    message: Optional[str] = None
+    thread_id: Optional[str] = None
+
+class FlightBatchRequest(BaseModel):
+    items: List[FlightSearchRequest] = Field(min_length=1, max_length=BATCH_MAX_ITEMS)
+    concurrency: Optional[int] = Field(None, ge=1)
+
+class HotelBatchRequest(BaseModel):
+    items: List[HotelSearchRequest] = Field(min_length=1, max_length=BATCH_MAX_ITEMS)
+    concurrency: Optional[int] = Field(None, ge=1)
@@ -0,0 +1,53 @@
+import os
+
+import logfire
+from fastapi import Request
+from langchain_openai import ChatOpenAI
+
+from agents.agent import Agent
+from agents.coordinator import TravelCoordinator
+from agents.email_queue import get_email_queue
+from agents.search_agents import (
+    FlightSearchAgent, HotelSearchAgent,
+    ActivitySearchAgent, RestaurantSearchAgent
+)
+from agents.tools import serpapi_client
+from agents.tools.search_cache import get_cache
+
+SEARCH_LLM_MODEL = os.getenv("SEARCH_LLM_MODEL", "gpt-4")
+SERPAPI_WARMUP = os.getenv("SERPAPI_WARMUP", "1") not in ("0", "false", "False")
+
+class AgentRegistry:
+    """
+    Agents, LLM clients and the SerpAPI pool, built once per worker.
+
+    The agents keep no per-request state, so every request can share them.
+    """
+
+    def __init__(self):
+        with logfire.span("build agent registry"):
+            self.llm = ChatOpenAI(model=SEARCH_LLM_MODEL)
+            self.flight_agent = FlightSearchAgent(self.llm)
+            self.hotel_agent = HotelSearchAgent(self.llm)
+            self.activity_agent = ActivitySearchAgent(self.llm)
+            self.restaurant_agent = RestaurantSearchAgent(self.llm)
+            self.coordinator = TravelCoordinator(self.llm)
+            self.email_queue = get_email_queue()
+            with logfire.span("build travel agent graph"):
+                self.travel_agent = Agent(email_queue=self.email_queue)
+            self.serpapi = serpapi_client.get_client()
+            self.cache = get_cache()
+
+    async def warmup(self):
+        # Resume delivery of anything a previous process left in the outbox
+        self.email_queue.start()
+        if SERPAPI_WARMUP:
+            await self.serpapi.warmup()
+
+    async def aclose(self):
+        self.travel_agent.close()
+        self.email_queue.stop(timeout=5)
+        await serpapi_client.aclose_client()
+
+def get_registry(request: Request) -> AgentRegistry:
+    return request.app.state.registry
@@ -0,0 +1,134 @@
+"""
+Production server: a gunicorn master supervising uvicorn workers.
+
+The master imports the app once before forking (preload), so a broken build
+fails before any worker starts and workers share the imported modules'
+memory. Each worker builds its own AgentRegistry in the app lifespan, so no
+connection or thread crosses a fork.
+
+Workers are recycled after API_MAX_REQUESTS requests (plus up to
+API_MAX_REQUESTS_JITTER, so they don't all restart at once) or once their
+resident memory passes API_MAX_RSS_MB; in-flight requests finish first.
+
+Signals to the master:
+    HUP        restart every worker gracefully (the preloaded code is kept)
+    USR2       start a new master on the current code; then TERM the old one
+    TTIN/TTOU  add or remove a worker
+    TERM       graceful shutdown, waiting up to API_GRACEFUL_TIMEOUT
+
+State workers must agree on lives in files they all open: the SerpAPI and
+LLM response caches, the SerpAPI token bucket, agent checkpoints and the
+email outbox (SQLite in WAL mode), and Prometheus metrics.
+"""
+import os
+import resource
+import signal
+import sys
+import tempfile
+
+from dotenv import load_dotenv
+from gunicorn.app.base import BaseApplication
+from gunicorn.util import import_app
+from uvicorn_worker import UvicornWorker
+
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+# Workers are async, so one per core keeps every core busy.
+API_WORKERS = int(os.getenv("API_WORKERS", str(os.cpu_count() or 1)))
+API_MAX_REQUESTS = int(os.getenv("API_MAX_REQUESTS", "10000"))
+API_MAX_REQUESTS_JITTER = int(os.getenv("API_MAX_REQUESTS_JITTER", "1000"))
+# 0 turns the memory limit off.
+API_MAX_RSS_MB = float(os.getenv("API_MAX_RSS_MB", "1024"))
+# A worker whose event loop is blocked this long is killed and replaced.
+API_TIMEOUT = int(os.getenv("API_TIMEOUT", "60"))
+API_GRACEFUL_TIMEOUT = int(os.getenv("API_GRACEFUL_TIMEOUT", "30"))
+API_KEEPALIVE = int(os.getenv("API_KEEPALIVE", "5"))
+
+# Stores that are per process unless given a path. Settings from the
+# environment or .env win; an explicit empty value keeps that state per worker.
+SHARED_STATE_DEFAULTS = {
+    "SERPAPI_CACHE_PATH": "serpapi_cache.db",
+    "LLM_CACHE_PATH": "llm_cache.db",
+    "SERPAPI_RATE_LIMIT_PATH": "serpapi_rate_limit.db",
+    "AGENT_CHECKPOINT_PATH": "agent_checkpoints.db",
+    "EMAIL_QUEUE_PATH": "email_outbox.db",
+    "PROMETHEUS_MULTIPROC_DIR": os.path.join(tempfile.gettempdir(), "tripsy-prometheus"),
+}
+
+def rss_bytes() -> int:
+    """Current resident set size; the peak where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def configure_shared_state(workers: int):
+    """Point every cross-worker store at a file. Must run before the app is imported."""
+    # The agents call load_dotenv at import, which never overrides: load it first
+    # so .env settings are not shadowed by the defaults below
+    load_dotenv()
+    for name, default in SHARED_STATE_DEFAULTS.items():
+        os.environ.setdefault(name, default)
+        if workers > 1 and not os.environ[name]:
+            print(f"{name} is empty: each of the {workers} workers keeps its own copy of that state")
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    if metrics_dir:
+        # Files left by a previous run would be merged into this one's counters
+        os.makedirs(metrics_dir, exist_ok=True)
+        for name in os.listdir(metrics_dir):
+            if name.endswith(".db"):
+                os.remove(os.path.join(metrics_dir, name))
+
+class RecyclingUvicornWorker(UvicornWorker):
+    """UvicornWorker that also retires once its RSS passes API_MAX_RSS_MB."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_rss = API_MAX_RSS_MB * 1024 * 1024
+        self.retiring = False
+
+    async def callback_notify(self):
+        # Called from the uvicorn main loop every `timeout / 2` seconds
+        await super().callback_notify()
+        if self.max_rss and not self.retiring and rss_bytes() > self.max_rss:
+            self.retiring = True
+            print(f"Worker {self.pid} is over {API_MAX_RSS_MB:g} MB RSS, restarting after in-flight requests")
+            # uvicorn treats SIGTERM as a graceful shutdown; the master then starts a replacement
+            os.kill(self.pid, signal.SIGTERM)
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        # Drops the dead worker's live gauges (in-flight requests, circuit states)
+        multiprocess.mark_process_dead(worker.pid)
+
+class ProductionServer(BaseApplication):
+    def __init__(self, app_uri: str, options: dict):
+        self.app_uri = app_uri
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return import_app(self.app_uri)
+
+def run(app_uri: str = "api.main:app", workers: int = API_WORKERS):
+    configure_shared_state(workers)
+    ProductionServer(app_uri, {
+        "bind": f"{API_HOST}:{API_PORT}",
+        "workers": workers,
+        "worker_class": "api.server.RecyclingUvicornWorker",
+        "preload_app": True,
+        "max_requests": API_MAX_REQUESTS,
+        "max_requests_jitter": API_MAX_REQUESTS_JITTER,
+        "timeout": API_TIMEOUT,
+        "graceful_timeout": API_GRACEFUL_TIMEOUT,
+        "keepalive": API_KEEPALIVE,
+        "child_exit": child_exit,
+    }).run()
@@ -0,0 +1,54 @@
+import asyncio
+import json
+import uuid
+from typing import AsyncIterator, Optional
+
+from langchain_core.messages import HumanMessage
+
+from agents.agent import Agent
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def agent_events(agent: Agent, message: Optional[str], thread_id: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Run the travel Agent graph and yield Server-Sent Events as it goes.
+
+    Events: `thread` (the id to resume with), `token` (LLM text from
+    call_tools_llm), `tool_start`/`tool_end`, `interrupt` when the graph stops
+    before email_sender, `done` with the final answer, the `usage` of this run,
+    the `thread_usage` so far and the `stop_reason` if a limit ended the run,
+    and `error`.
+    Posting again with the same thread_id and no message resumes the graph.
+    """
+    thread_id = thread_id or str(uuid.uuid4())
+    config = {"configurable": {"thread_id": thread_id}}
+    inputs = {"messages": [HumanMessage(content=message)]} if message else None
+    yield sse("thread", {"thread_id": thread_id})
+
+    try:
+        async for event in agent.graph.astream_events(inputs, config, version="v2"):
+            kind = event["event"]
+            node = event.get("metadata", {}).get("langgraph_node")
+            if kind == "on_chat_model_stream" and node == "call_tools_llm":
+                content = event["data"]["chunk"].content
+                if content:
+                    yield sse("token", {"content": content})
+            elif kind == "on_tool_start":
+                yield sse("tool_start", {"id": event["run_id"], "name": event["name"], "input": event["data"].get("input")})
+            elif kind == "on_tool_end":
+                yield sse("tool_end", {"id": event["run_id"], "name": event["name"], "output": event["data"].get("output")})
+
+        # Checkpoints mid-run stay batched; the last one must be on disk before the
+        # client can resume the thread on another worker
+        await asyncio.to_thread(agent.flush_checkpoints)
+        state = await agent.graph.aget_state(config)
+        if state.next:
+            yield sse("interrupt", {"thread_id": thread_id, "next": list(state.next)})
+        messages = state.values.get("messages", [])
+        yield sse("done", {"thread_id": thread_id, "content": messages[-1].content if messages else None,
+                           "stop_reason": state.values.get("stop_reason"), "usage": agent.run_usage(state.values),
+                           "thread_usage": state.values.get("usage", {})})
+    except Exception as e:
+        print(f"Exception in agent stream: {str(e)}")
+        yield sse("error", {"thread_id": thread_id, "detail": str(e)})
@@ -0,0 +1,86 @@
+import json
+import random
+
+from standin.fixtures import FixtureStore, openai_key, serpapi_key
+
+AIRLINES = ["United", "Delta", "American", "Alaska", "JetBlue", "Air France", "Lufthansa"]
+
+
+def _flight(rng: random.Random, origin: str, destination: str) -> dict:
+    stops = rng.choice([0, 0, 1, 1, 2])
+    airports = [origin] + rng.sample(["ORD", "DEN", "ATL", "DFW", "CDG"], stops) + [destination]
+    legs = []
+    for i in range(len(airports) - 1):
+        legs.append({
+            "departure_airport": {"id": airports[i], "name": f"{airports[i]} Airport", "time": f"2025-10-01 {8 + 3 * i:02d}:00"},
+            "arrival_airport": {"id": airports[i + 1], "name": f"{airports[i + 1]} Airport", "time": f"2025-10-01 {10 + 3 * i:02d}:30"},
+            "duration": rng.randint(60, 420),
+            "airline": rng.choice(AIRLINES),
+            "flight_number": f"XX {rng.randint(10, 9999)}",
+            "airplane": "Airbus A321",
+            "travel_class": "Economy",
+        })
+    return {"flights": legs, "price": rng.randint(120, 1400), "total_duration": sum(l["duration"] for l in legs) + 60 * stops,
+            "type": "Round trip", "airline_logo": "https://www.gstatic.com/flights/airline_logos/70px/XX.png"}
+
+
+def _hotel(rng: random.Random, i: int) -> dict:
+    nightly = rng.randint(60, 600)
+    return {"name": f"Hotel {i}", "rate_per_night": {"extracted_lowest": nightly},
+            "total_rate": {"extracted_lowest": nightly * 4}, "overall_rating": round(rng.uniform(3, 5), 1),
+            "reviews": rng.randint(10, 5000), "extracted_hotel_class": rng.randint(2, 5),
+            "gps_coordinates": {"latitude": 48.85 + rng.uniform(-0.05, 0.05), "longitude": 2.35 + rng.uniform(-0.05, 0.05)},
+            "description": "Synthetic benchmark hotel", "amenities": ["Free Wi-Fi", "Breakfast", "Pool"],
+            "images": [{"thumbnail": "https://example.com/thumb.jpg"}], "link": "https://example.com/hotel"}
+
+
+def _place(rng: random.Random, i: int) -> dict:
+    return {"title": f"Attraction {i}", "type": "Museum", "rating": round(rng.uniform(3.5, 5), 1),
+            "reviews": rng.randint(10, 20000), "price": rng.choice(["$", "$$", "$20", None]),
+            "address": f"{i} Rue de Rivoli", "gps_coordinates": {"latitude": 48.86, "longitude": 2.34},
+            "thumbnail": "https://example.com/place.jpg", "website": "https://example.com/place"}
+
+
+def _completion(message: dict, finish_reason: str) -> dict:
+    return {"id": "chatcmpl-bench", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+            "choices": [{"index": 0, "message": {"role": "assistant", **message}, "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": 900, "completion_tokens": 120, "total_tokens": 1020}}
+
+
+def write_fixtures(root: str, results: int = 40, seed: int = 7) -> FixtureStore:
+    """
+    Synthetic stand-in fixtures: one payload per SerpAPI engine with `results`
+    entries each, and two chat completions for the travel Agent, a tool-calling
+    answer to a user turn and a final answer after tool results. The stand-in
+    serves them for any request through its fallback.
+    """
+    rng = random.Random(seed)
+    store = FixtureStore(root)
+    flights = [_flight(rng, "SFO", "CDG") for _ in range(results)]
+    searches = {
+        "google_flights": {"best_flights": flights[:3], "other_flights": flights[3:]},
+        "google_hotels": {"properties": [_hotel(rng, i) for i in range(results)]},
+        "google_maps": {"local_results": [_place(rng, i) for i in range(results)]},
+    }
+    for engine, body in searches.items():
+        params = {"engine": engine}
+        store.save("serpapi", engine, serpapi_key(params), params, 200, body, 0)
+
+    flight_args = {"params": {"departure_airport": "SFO", "arrival_airport": "CDG", "outbound_date": "2025-10-01",
+                              "return_date": "2025-10-05", "adults": 1, "children": 0, "infants_in_seat": 0,
+                              "infants_on_lap": 0}}
+    hotel_args = {"params": {"q": "Paris", "check_in_date": "2025-10-01", "check_out_date": "2025-10-05",
+                             "adults": 1, "children": 0, "rooms": 1, "sort_by": "8", "hotel_class": None}}
+    tool_calls = [
+        {"id": "call_flights", "type": "function", "function": {"name": "flights_finder", "arguments": json.dumps(flight_args)}},
+        {"id": "call_hotels", "type": "function", "function": {"name": "hotels_finder", "arguments": json.dumps(hotel_args)}},
+    ]
+    chats = [
+        ({"model": "gpt-4o", "messages": [{"role": "user", "content": "bench"}]},
+         _completion({"content": None, "tool_calls": tool_calls}, "tool_calls")),
+        ({"model": "gpt-4o", "messages": [{"role": "tool", "content": "bench"}]},
+         _completion({"content": "Here are the best flights and hotels for your trip to Paris. " * 8}, "stop")),
+    ]
+    for request, completion in chats:
+        store.save("openai", "gpt-4o", openai_key(request), request, 200, completion, 0)
+    return store
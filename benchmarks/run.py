@@ -0,0 +1,251 @@
+"""
+Load and latency benchmarks for the API search endpoints and the Agent graph.
+
+Upstreams are replaced by the record/replay stand-in (see standin/) serving
+synthetic fixtures, so runs cost no quota and only measure this code base.
+Each scenario runs at every concurrency level as a closed loop: that many
+workers issue requests back to back until the request count is reached.
+
+    python -m benchmarks.run --concurrency 1,8,32 --baseline benchmarks/baseline.json
+
+Results are written as JSON. With a baseline, a scenario whose p95 grows or
+whose throughput drops by more than --threshold fails the run (exit code 1).
+CPU and RSS are those of the benchmark process, which hosts both the API app
+and the load driver; the stand-in runs in its own process.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+import httpx
+import numpy as np
+
+SCENARIOS = ("flights", "hotels", "activities", "restaurants", "agent")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+CITIES = ["SFO", "LAX", "JFK", "ORD", "SEA", "BOS", "MIA", "DEN", "CDG", "LHR", "NRT", "FCO"]
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # ru_maxrss is the peak, in KiB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def start_standin(fixtures: str, port: int, latency: str, error_rate: float) -> subprocess.Popen:
+    env = {**os.environ, "STANDIN_MODE": "replay", "STANDIN_FIXTURES": fixtures, "STANDIN_FALLBACK": "1",
+           "STANDIN_LATENCY": latency, "STANDIN_ERROR_RATE": str(error_rate), "STANDIN_SEED": "1"}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "standin.server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"], env=env)
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/account.json", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("stand-in did not start")
+
+def request_bodies(scenario: str, distinct: int, seed: int) -> list[dict]:
+    """`distinct` different searches, so the cache and coalescing see a realistic mix."""
+    rng = random.Random(seed)
+    bodies = []
+    for _ in range(distinct):
+        start = date(2025, 10, 1) + timedelta(days=rng.randint(0, 90))
+        base = {"start_date": str(start), "end_date": str(start + timedelta(days=rng.randint(2, 10))),
+                "budget": rng.choice([800, 1500, 3000, 6000]), "travelers": rng.randint(1, 3)}
+        if scenario == "flights":
+            origin, destination = rng.sample(CITIES, 2)
+            bodies.append({**base, "departure_city": origin, "arrival_city": destination})
+        else:
+            bodies.append({**base, "city": rng.choice(CITIES)})
+    return bodies
+
+async def run_level(call, concurrency: int, requests: int) -> dict:
+    latencies, errors = [], 0
+    issued = 0
+
+    async def worker():
+        nonlocal issued, errors
+        while issued < requests:
+            issued += 1
+            start = time.perf_counter()
+            try:
+                await call(issued)
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    cpu, wall = _cpu_seconds(), time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall, cpu = time.perf_counter() - wall, _cpu_seconds() - cpu
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / wall, 1),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "cpu_percent": round(100 * cpu / wall, 1),
+        "rss_mb": round(_rss_mb(), 1),
+    }
+
+async def run_benchmarks(args) -> list[dict]:
+    # Imported here: the app reads its configuration from the environment at import
+    from langchain_core.messages import HumanMessage
+    from api.main import app
+
+    results = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            registry = app.state.registry
+            for scenario in args.scenarios:
+                if scenario == "agent":
+                    async def call(i):
+                        config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+                        state = await registry.travel_agent.graph.ainvoke(
+                            {"messages": [HumanMessage(content=f"Trip {i}: SFO to Paris in October")]}, config)
+                        if not state["messages"][-1].content:
+                            raise RuntimeError("agent returned no answer")
+                    requests = args.agent_requests
+                else:
+                    bodies = request_bodies(scenario, args.distinct, args.seed)
+
+                    async def call(i, scenario=scenario, bodies=bodies):
+                        response = await client.post(f"/api/{scenario}/search", json=bodies[i % len(bodies)])
+                        response.raise_for_status()
+                    requests = args.requests
+                for concurrency in args.concurrency:
+                    result = {"scenario": scenario, **await run_level(call, concurrency, requests)}
+                    print(f"{scenario:12} c={concurrency:<4} {result['rps']:>8} req/s  p50 {result['p50_ms']:>8} ms  "
+                          f"p95 {result['p95_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  cpu {result['cpu_percent']:>6}%  "
+                          f"rss {result['rss_mb']} MB  errors {result['errors']}")
+                    results.append(result)
+    return results
+
+def compare(results: list[dict], baseline: list[dict], threshold: float) -> list[str]:
+    """Scenarios whose p95 rose or whose throughput fell by more than `threshold`."""
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result["scenario"], result["concurrency"]))
+        if before is None:
+            continue
+        name = f"{result['scenario']} c={result['concurrency']}"
+        if result["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {before['p95_ms']} -> {result['p95_ms']} ms")
+        if result["rps"] < before["rps"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {before['rps']} -> {result['rps']} req/s")
+    return regressions
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=lambda s: s.split(","), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=200, help="requests per search scenario and level")
+    parser.add_argument("--agent-requests", type=int, default=40, help="graph runs per concurrency level")
+    parser.add_argument("--distinct", type=int, default=100, help="distinct search bodies per scenario")
+    parser.add_argument("--results", type=int, default=40, help="results per synthetic SerpAPI payload")
+    parser.add_argument("--latency", default="lognormal:4.0,0.5", help="stand-in latency spec in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--no-cache", action="store_true", help="disable the SerpAPI result cache")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/bench-<time>.json)")
+    parser.add_argument("--baseline", help="earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="tripsy-bench-")
+    from benchmarks.fixtures import write_fixtures
+    write_fixtures(os.path.join(workdir, "fixtures"), results=args.results, seed=args.seed)
+
+    port = _free_port()
+    standin = start_standin(os.path.join(workdir, "fixtures"), port, args.latency, args.error_rate)
+    os.environ.update({
+        "SERPAPI_URL": f"http://127.0.0.1:{port}/search.json",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{port}/v1",
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY") or "bench",
+        "SERP_API_KEY": os.environ.get("SERP_API_KEY") or "bench",
+        "EMAIL_SENDER": "stub",
+        "EMAIL_QUEUE_PATH": os.path.join(workdir, "outbox.db"),
+        "SERPAPI_CACHE_ENABLED": "0" if args.no_cache else os.environ.get("SERPAPI_CACHE_ENABLED", "1"),
+        # The stand-in has no quota; throttling would only measure the limiter's rate
+        "SERPAPI_RATE": os.environ.get("SERPAPI_RATE", "0"),
+        "SERPAPI_RATE_LIMIT_PATH": os.path.join(workdir, "rate_limit.db"),
+    })
+    os.environ.pop("AGENT_CHECKPOINT_PATH", None)
+    try:
+        results = asyncio.run(run_benchmarks(args))
+    finally:
+        standin.terminate()
+        standin.wait()
+
+    report = {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "settings": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.threshold)
+        if regressions:
+            print(f"Regressions above {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"No regressions above {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
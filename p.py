@@ -10,9 +10,15 @@ from pydantic_ai import Agent, ModelRetry, RunContext
 from pydantic_ai.messages import ModelMessage
 from pydantic_ai.usage import Usage, UsageLimits
 
+from agents.pydantic_cache import CachedModel
+
 # 'if-token-present' means nothing will be sent (and the example will work) if you don't have logfire configured
 logfire.configure(send_to_logfire='if-token-present')
 
+# Identical prompts (the same web page text, the same seat answer) are served
+# from the shared LLM response cache instead of calling the model again.
+model = CachedModel('openai:gpt-4o')
+
 
 class FlightDetails(BaseModel):
     """Details of the most suitable flight."""
@@ -38,7 +44,7 @@ class Deps:
 
 # This agent is responsible for controlling the flow of the conversation.
 search_agent = Agent[Deps, FlightDetails | NoFlightFound](
-    'openai:gpt-4o',
+    model,
     result_type=FlightDetails | NoFlightFound,  # type: ignore
     retries=4,
     system_prompt=(
@@ -49,7 +55,7 @@ search_agent = Agent[Deps, FlightDetails | NoFlightFound](
 
 # This agent is responsible for extracting flight details from web page text.
 extraction_agent = Agent(
-    'openai:gpt-4o',
+    model,
     result_type=list[FlightDetails],
     system_prompt='Extract all the flight details from the given text.',
 )
@@ -103,7 +109,7 @@ class Failed(BaseModel):
 seat_preference_agent = Agent[
     None, SeatPreference | Failed
 ](
-    'openai:gpt-4o',
+    model,
     result_type=SeatPreference | Failed,  # type: ignore
     system_prompt=(
         "Extract the user's seat preference. "
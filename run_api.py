@@ -1,4 +1,15 @@
+import os
+
 import uvicorn
 
+# dev: one process that reloads on code changes. production: see api/server.py.
+API_MODE = os.getenv("API_MODE", "dev")
+
 if __name__ == "__main__":
-    uvicorn.run("api.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    if API_MODE == "production":
+        from api.server import run
+
+        run()
+    else:
+        uvicorn.run("api.main:app", host=os.getenv("API_HOST", "0.0.0.0"), port=int(os.getenv("API_PORT", "8000")),
+                    reload=True)
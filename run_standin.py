@@ -0,0 +1,6 @@
+import os
+
+import uvicorn
+
+if __name__ == "__main__":
+    uvicorn.run("standin.server:app", host="127.0.0.1", port=int(os.getenv("STANDIN_PORT", "8100")))
@@ -0,0 +1,11 @@
+"""
+Local stand-in for SerpAPI and the OpenAI chat completions API.
+
+Point the app at it through the environment:
+
+    SERPAPI_URL=http://127.0.0.1:8100/search.json
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1
+
+and run `python run_standin.py`. See standin.server for the STANDIN_*
+settings (mode, fixture directory, latency and error injection).
+"""
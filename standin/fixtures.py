@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from agents.tools.search_cache import canonical_params
+
+# Request fields that do not change what the model answers.
+OPENAI_IGNORED_FIELDS = ("stream", "stream_options", "user")
+
+
+def serpapi_key(params: dict) -> str:
+    payload = json.dumps(canonical_params(params), separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def openai_key(body: dict) -> str:
+    canonical = {k: v for k, v in body.items() if k not in OPENAI_IGNORED_FIELDS}
+    payload = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class FixtureStore:
+    """
+    Recorded upstream responses on disk, one JSON file per request:
+    `<root>/serpapi/<engine>/<key>.json` and `<root>/openai/<model>/<key>.json`.
+
+    Each file holds the canonical request, the response status and body, and
+    the latency observed while recording. Files are plain JSON so fixtures
+    can be reviewed and committed alongside a benchmark.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._listing: dict[str, list[str]] = {}
+        self._loaded: dict[str, dict] = {}
+
+    def _path(self, group: str, name: str, key: str) -> str:
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in name or "default")
+        return os.path.join(self.root, group, safe, f"{key}.json")
+
+    def load(self, group: str, name: str, key: str) -> Optional[dict]:
+        try:
+            with open(self._path(group, name, key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, group: str, name: str, key: str, request, status: int, body, latency_ms: float):
+        path = self._path(group, name, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fixture = {"request": request, "status": status, "body": body,
+                   "latency_ms": round(latency_ms, 1), "recorded_at": time.time()}
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(fixture, f, indent=1)
+        os.replace(tmp, path)
+        with self._lock:
+            self._listing.pop(os.path.dirname(path), None)
+            self._loaded.pop(path, None)
+
+    def _read(self, path: str) -> dict:
+        fixture = self._loaded.get(path)
+        if fixture is None:
+            with open(path) as f:
+                fixture = self._loaded[path] = json.load(f)
+        return fixture
+
+    def any(self, group: str, name: str, key: str, match: Optional[Callable[[dict], bool]] = None) -> Optional[dict]:
+        """
+        A recorded fixture of the same group and name, chosen deterministically
+        by key among those `match` accepts. Fallback fixtures stay in memory.
+        """
+        directory = os.path.dirname(self._path(group, name, key))
+        with self._lock:
+            files = self._listing.get(directory)
+            if files is None:
+                try:
+                    files = sorted(f for f in os.listdir(directory) if f.endswith(".json"))
+                except FileNotFoundError:
+                    files = []
+                self._listing[directory] = files
+        start = int(key[:8], 16)
+        for offset in range(len(files)):
+            fixture = self._read(os.path.join(directory, files[(start + offset) % len(files)]))
+            if match is None or match(fixture):
+                return fixture
+        return None
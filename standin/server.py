@@ -0,0 +1,210 @@
+import asyncio
+import json
+import os
+import random
+import re
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from standin.fixtures import FixtureStore, openai_key, serpapi_key
+
+# replay: serve fixtures only; record: always call upstream and overwrite;
+# auto: replay what exists and record the rest.
+STANDIN_MODE = os.getenv("STANDIN_MODE", "replay")
+STANDIN_FIXTURES = os.getenv("STANDIN_FIXTURES", "fixtures")
+# Serve another fixture when a request was never recorded, so load tests can
+# vary their parameters: same engine for searches, same model and same role
+# of the last message (user turn vs. tool results) for chat completions.
+STANDIN_FALLBACK = os.getenv("STANDIN_FALLBACK", "1") not in ("0", "false", "False")
+STANDIN_SERPAPI_UPSTREAM = os.getenv("STANDIN_SERPAPI_UPSTREAM", "https://serpapi.com/search.json")
+STANDIN_OPENAI_UPSTREAM = os.getenv("STANDIN_OPENAI_UPSTREAM", "https://api.openai.com/v1")
+STANDIN_SEED = os.getenv("STANDIN_SEED")
+
+# Latency spec in milliseconds: "none", "recorded", "fixed:80", "uniform:20,200",
+# "normal:120,30" or "lognormal:4.5,0.6" (mu and sigma of the log).
+STANDIN_LATENCY = os.getenv("STANDIN_LATENCY", "none")
+STANDIN_SERPAPI_LATENCY = os.getenv("STANDIN_SERPAPI_LATENCY", STANDIN_LATENCY)
+STANDIN_OPENAI_LATENCY = os.getenv("STANDIN_OPENAI_LATENCY", STANDIN_LATENCY)
+# Delay between streamed chat completion chunks, also a latency spec.
+STANDIN_OPENAI_CHUNK_LATENCY = os.getenv("STANDIN_OPENAI_CHUNK_LATENCY", "none")
+
+STANDIN_ERROR_RATE = float(os.getenv("STANDIN_ERROR_RATE", "0"))
+STANDIN_SERPAPI_ERROR_RATE = float(os.getenv("STANDIN_SERPAPI_ERROR_RATE", str(STANDIN_ERROR_RATE)))
+STANDIN_OPENAI_ERROR_RATE = float(os.getenv("STANDIN_OPENAI_ERROR_RATE", str(STANDIN_ERROR_RATE)))
+STANDIN_ERROR_STATUS = int(os.getenv("STANDIN_ERROR_STATUS", "503"))
+
+_random = random.Random(STANDIN_SEED)
+
+def parse_latency(spec: str):
+    """Turn a latency spec into a sampler of milliseconds; `recorded` returns None."""
+    kind, _, args = (spec or "none").partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()]
+    if kind == "none":
+        return lambda recorded: 0.0
+    if kind == "recorded":
+        return lambda recorded: recorded or 0.0
+    if kind == "fixed":
+        return lambda recorded: values[0]
+    if kind == "uniform":
+        return lambda recorded: _random.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda recorded: max(0.0, _random.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda recorded: _random.lognormvariate(values[0], values[1])
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+class Upstream:
+    """Latency and error injection settings for one stand-in upstream."""
+
+    def __init__(self, name: str, latency: str, error_rate: float):
+        self.name = name
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+
+    async def delay(self, fixture: Optional[dict]):
+        ms = self.latency(fixture.get("latency_ms") if fixture else None)
+        if ms > 0:
+            await asyncio.sleep(ms / 1000)
+
+    def fail(self) -> bool:
+        return self.error_rate > 0 and _random.random() < self.error_rate
+
+store = FixtureStore(STANDIN_FIXTURES)
+serpapi = Upstream("serpapi", STANDIN_SERPAPI_LATENCY, STANDIN_SERPAPI_ERROR_RATE)
+openai = Upstream("openai", STANDIN_OPENAI_LATENCY, STANDIN_OPENAI_ERROR_RATE)
+chunk_latency = parse_latency(STANDIN_OPENAI_CHUNK_LATENCY)
+stats = Counter()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.http = httpx.AsyncClient(timeout=httpx.Timeout(120, connect=10))
+    yield
+    await app.state.http.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+async def _record(request: Request, method: str, url: str, **kwargs):
+    start = time.perf_counter()
+    response = await request.app.state.http.request(method, url, **kwargs)
+    latency_ms = (time.perf_counter() - start) * 1000
+    try:
+        body = response.json()
+    except ValueError:
+        body = {"error": response.text}
+    return response.status_code, body, latency_ms
+
+@app.get("/account.json")
+async def account():
+    # SerpAPIClient.warmup only needs a cheap 200
+    return {"account_id": "standin", "plan_searches_left": None}
+
+@app.get("/search.json")
+async def serpapi_search(request: Request):
+    params = dict(request.query_params)
+    engine = params.get("engine", "default")
+    key = serpapi_key(params)
+
+    if serpapi.fail():
+        stats["serpapi.injected_errors"] += 1
+        await serpapi.delay(None)
+        return JSONResponse({"error": "Injected stand-in error"}, status_code=STANDIN_ERROR_STATUS)
+
+    fixture = None if STANDIN_MODE == "record" else store.load("serpapi", engine, key)
+    if fixture is None and STANDIN_MODE in ("record", "auto"):
+        status, body, latency_ms = await _record(request, "GET", STANDIN_SERPAPI_UPSTREAM, params=params)
+        store.save("serpapi", engine, key, {k: v for k, v in params.items() if k != "api_key"},
+                   status, body, latency_ms)
+        stats["serpapi.recorded"] += 1
+        return JSONResponse(body, status_code=status)
+    if fixture is None and STANDIN_FALLBACK:
+        fixture = store.any("serpapi", engine, key)
+        stats["serpapi.fallbacks"] += fixture is not None
+    if fixture is None:
+        stats["serpapi.misses"] += 1
+        return JSONResponse({"error": f"No stand-in fixture for {engine} {key}"}, status_code=404)
+
+    stats["serpapi.replayed"] += 1
+    await serpapi.delay(fixture)
+    return JSONResponse(fixture["body"], status_code=fixture["status"])
+
+def _pieces(text: str) -> list[str]:
+    return re.findall(r"\S+\s*|\s+", text) if text else []
+
+def completion_chunks(completion: dict, include_usage: bool):
+    """Re-stream a recorded chat completion the way the API streams it."""
+    base = {"id": completion.get("id"), "object": "chat.completion.chunk", "created": completion.get("created"),
+            "model": completion.get("model"), "system_fingerprint": completion.get("system_fingerprint")}
+    for choice in completion.get("choices", []):
+        index, message = choice.get("index", 0), choice.get("message") or {}
+        deltas = [{"role": "assistant", "content": ""}]
+        deltas += [{"content": piece} for piece in _pieces(message.get("content") or "")]
+        for i, call in enumerate(message.get("tool_calls") or []):
+            deltas.append({"tool_calls": [{"index": i, "id": call["id"], "type": call.get("type", "function"),
+                                           "function": call["function"]}]})
+        for delta in deltas:
+            yield {**base, "choices": [{"index": index, "delta": delta, "finish_reason": None}]}
+        yield {**base, "choices": [{"index": index, "delta": {}, "finish_reason": choice.get("finish_reason")}]}
+    if include_usage:
+        yield {**base, "choices": [], "usage": completion.get("usage")}
+
+async def _stream(completion: dict, include_usage: bool):
+    for chunk in completion_chunks(completion, include_usage):
+        ms = chunk_latency(None)
+        if ms > 0:
+            await asyncio.sleep(ms / 1000)
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+def _last_role(body: dict) -> Optional[str]:
+    messages = body.get("messages") or [{}]
+    return messages[-1].get("role")
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "default")
+    key = openai_key(body)
+    stream = bool(body.get("stream"))
+    include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+    if openai.fail():
+        stats["openai.injected_errors"] += 1
+        await openai.delay(None)
+        return JSONResponse({"error": {"message": "Injected stand-in error", "type": "server_error"}},
+                            status_code=STANDIN_ERROR_STATUS)
+
+    fixture = None if STANDIN_MODE == "record" else store.load("openai", model, key)
+    if fixture is None and STANDIN_MODE in ("record", "auto"):
+        # Always record the complete response; streaming is re-created on replay
+        upstream_body = {k: v for k, v in body.items() if k not in ("stream", "stream_options")}
+        headers = {"Authorization": request.headers.get("authorization", "")}
+        status, completion, latency_ms = await _record(request, "POST", f"{STANDIN_OPENAI_UPSTREAM}/chat/completions",
+                                                       json=upstream_body, headers=headers)
+        store.save("openai", model, key, upstream_body, status, completion, latency_ms)
+        stats["openai.recorded"] += 1
+        fixture = {"status": status, "body": completion, "latency_ms": None}
+    else:
+        if fixture is None and STANDIN_FALLBACK:
+            role = _last_role(body)
+            fixture = store.any("openai", model, key, match=lambda f: _last_role(f["request"]) == role)
+            stats["openai.fallbacks"] += fixture is not None
+        if fixture is None:
+            stats["openai.misses"] += 1
+            return JSONResponse({"error": {"message": f"No stand-in fixture for {model} {key}",
+                                           "type": "invalid_request_error"}}, status_code=404)
+        stats["openai.replayed"] += 1
+        await openai.delay(fixture)
+
+    if stream and fixture["status"] < 400:
+        return StreamingResponse(_stream(fixture["body"], include_usage), media_type="text/event-stream")
+    return JSONResponse(fixture["body"], status_code=fixture["status"])
+
+@app.get("/standin/stats")
+async def standin_stats():
+    return {"mode": STANDIN_MODE, "fixtures": STANDIN_FIXTURES, "counts": dict(stats)}
@@ -0,0 +1,59 @@
+import unittest
+
+from agents.email_queue import EmailQueue, StubSender
+
+
+class ManualEmailQueue(EmailQueue):
+    '''Never starts the dispatcher, so a test claims and sends batches itself.'''
+
+    def start(self):
+        pass
+
+
+class EmailQueueTest(unittest.TestCase):
+
+    def test_retries_with_backoff_then_delivers(self):
+        sender = StubSender(fail_times=2)
+        queue = EmailQueue(path='', sender=sender, base_delay=0.01, max_delay=0.05, poll_interval=0.01)
+        self.addCleanup(queue.stop)
+        email_id = queue.enqueue('from@example.com', 'to@example.com', 'Trip', '<p>hi</p>')
+
+        self.assertTrue(queue.drain(timeout=5))
+        self.assertEqual(queue.stats(), {'sent': 1})
+        self.assertEqual(sender.calls, 3)
+        self.assertEqual([email.id for email in sender.sent], [email_id])
+        with queue._lock:
+            attempts, last_error = queue._conn.execute(
+                'SELECT attempts, last_error FROM outbox WHERE id = ?', (email_id,)).fetchone()
+        self.assertEqual(attempts, 3)
+        self.assertIsNone(last_error)
+
+    def test_gives_up_after_max_attempts(self):
+        sender = StubSender(fail_times=10)
+        queue = EmailQueue(path='', sender=sender, max_attempts=2, base_delay=0.01, max_delay=0.05,
+                           poll_interval=0.01)
+        self.addCleanup(queue.stop)
+        queue.enqueue('from@example.com', 'to@example.com', 'Trip', '<p>hi</p>')
+
+        self.assertTrue(queue.drain(timeout=5))
+        self.assertEqual(queue.stats(), {'failed': 1})
+        self.assertEqual(sender.calls, 2)
+
+    def test_rejected_group_is_split_per_recipient(self):
+        sender = StubSender(reject={'bad@example.com'})
+        queue = ManualEmailQueue(path='', sender=sender)
+        self.addCleanup(queue.stop)
+        for to_email in ('a@example.com', 'bad@example.com', 'b@example.com'):
+            queue.enqueue('from@example.com', to_email, 'Trip', '<p>hi</p>')
+
+        emails = queue._claim()
+        self.assertEqual(len(emails), 3)
+        queue._send_group(emails)
+
+        self.assertEqual(queue.stats(), {'failed': 1, 'sent': 2})
+        self.assertEqual(sorted(email.to_email for email in sender.sent), ['a@example.com', 'b@example.com'])
+        self.assertEqual(sender.calls, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()